@@ -2,10 +2,13 @@
 The cell module implements the Cell class that store cell value and contents
 and funcionality to parse formulas
 '''
+import re
 import json
 import decimal
+import operator
+import functools
+from collections import OrderedDict
 import lark
-from lark.visitors import visit_children_decor
 from .custom_func import DICTIONARY_FUNCTIONS
 from .cellerror import CellError
 from .cellerrortype import CellErrorType, str_to_error
@@ -39,18 +42,179 @@ _COMPARISON_LAMBDAS = {
     "<=": lambda a, b: a <= b,
 }
 
-# Parser for cell contents
-parser = lark.Lark.open('formulas.lark', rel_to=__file__, start='formula')
+def _divide(v_1, v_2):
+    try:
+        return v_1 / v_2
+    except ZeroDivisionError as err:
+        detail = "Cannot divide by 0"
+        return CellError(CellErrorType.DIVIDE_BY_ZERO, detail, err)
+
+# Arithmetic operations of the parsed operators
+_ARITHMETIC_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _divide,
+}
+
+# Parser for cell contents. The LALR grammar parses in linear time and the
+# built parser is cached so that importing the module doesn't rebuild it.
+parser = lark.Lark.open('formulas_lalr.lark', rel_to=__file__, start='formula',
+                        parser='lalr', cache=True)
+
+# Tokens of formula text: strings, quoted sheet names, words and anything else
+_FORMULA_TOKENS = re.compile(r'"[^"]*"|\'[^\']*\'|[$A-Za-z_][$A-Za-z0-9_]*|[^"\'$A-Za-z_]+|.',
+                             re.S)
+_CELLREF = re.compile(r'([$]?)([A-Za-z]+)([$]?)([1-9][0-9]*)')
+# Locations within the limits A-ZZZZ and 1-9999
+_LOCATION = re.compile(r'[A-Za-z]{1,4}[1-9][0-9]{0,3}')
+MAX_COL = 475254
+MAX_ROW = 9999
+# A word followed by these is a sheet name or a function name
+_NOT_CELLREF = re.compile(r'\s*[!(]')
+
+# Number of compiled formulas shared between cells
+_FORMULA_CACHE_SIZE = 10000
+
+@functools.lru_cache(maxsize=65536)
+def loc_to_coords(loc: str) -> tuple[int, int]:
+    '''
+    Converts a location to 2-tuple (col, row)
+    '''
+    match = _CELLREF.fullmatch(loc)
+    col = 0
+    for char in match.group(2).upper():
+        col = (col * 26) + (ord(char) - ord('A') + 1)
+    return (col, int(match.group(4)))
+
+@functools.lru_cache(maxsize=65536)
+def parse_location(loc: str) -> tuple[int, int]:
+    '''
+    Converts a location given to the workbook to 2-tuple (col, row), or
+    returns None if it is not a valid location
+    '''
+    if not isinstance(loc, str) or _LOCATION.fullmatch(loc) is None:
+        return None
+    return loc_to_coords(loc)
+
+def is_valid_coords(coords: tuple[int, int]) -> bool:
+    '''
+    Returns whether the (col, row) pair is within the limits of a sheet
+    '''
+    return 0 < coords[0] <= MAX_COL and 0 < coords[1] <= MAX_ROW
+
+@functools.lru_cache(maxsize=65536)
+def coords_to_loc(col: int, row: int) -> str:
+    '''
+    Converts a (col, row) pair to a location
+    '''
+    letter_str = ""
+    while col > 0:
+        col, modulo = divmod(col - 1, 26)
+        letter_str = chr(modulo + ord('A')) + letter_str
+    return letter_str + str(row)
+
+def relative_key(contents: str, anchor: tuple[int, int]) -> str:
+    '''
+    Returns the formula text with its cell references written relative to the
+    anchor location (like R1C1 notation), so that formulas filled across
+    cells share the same key
+    '''
+    if '\0' in contents:
+        return None
+    parts = []
+    for token in _FORMULA_TOKENS.finditer(contents):
+        ref = _CELLREF.fullmatch(token.group())
+        if ref is None or _NOT_CELLREF.match(contents, token.end()):
+            parts.append(token.group())
+            continue
+        col_abs, _, row_abs, _ = ref.groups()
+        col, row = loc_to_coords(token.group())
+        if not col_abs:
+            col -= anchor[0]
+        if not row_abs:
+            row -= anchor[1]
+        parts.append(f'\0{col_abs}{col},{row_abs}{row}\0')
+    return ''.join(parts)
+
+class _FormulaCache():
+    '''
+    A least-recently-used cache of compiled formulas keyed by relative_key.
+    Formulas that cannot be parsed are cached as None.
+    '''
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        '''
+        Returns the cached formula and marks it as recently used
+        '''
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, formula):
+        '''
+        Caches a formula, evicting the least recently used one when full
+        '''
+        self.entries[key] = formula
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        '''
+        Empties the cache
+        '''
+        self.entries.clear()
+
+formula_cache = _FormulaCache(_FORMULA_CACHE_SIZE)
+
+def compile_formula(contents: str, anchor: tuple[int, int] = None):
+    '''
+    Returns the compiled formula for the given contents, or None if it cannot
+    be parsed. Formulas of cells are anchored at the cell's location and
+    shared through formula_cache; without an anchor every reference is taken
+    as absolute.
+    '''
+    key = None if anchor is None else relative_key(contents, anchor)
+    if key is not None and key in formula_cache:
+        return formula_cache.get(key)
+    try:
+        formula = FormulaCompiler(anchor).compile(parser.parse(contents))
+    except lark.exceptions.LarkError:
+        formula = None
+    if key is not None:
+        formula_cache.put(key, formula)
+    return formula
+
+def ref_coords(ref, coords: tuple[int, int]) -> tuple[int, int]:
+    '''
+    Returns the (col, row) of a compiled reference made from the given cell
+    '''
+    _, col, row, col_abs, row_abs = ref
+    if not col_abs:
+        col += coords[0]
+    if not row_abs:
+        row += coords[1]
+    return (col, row)
 
 class _Cell():
+    # Cells only exist for locations with contents, and use slots to keep
+    # large sheets small
+    __slots__ = ('contents', 'formula', 'value', 'workbook', 'node', 'coords')
+
     # constructor
-    def __init__(self, workbook, sheet_name: str, location: str):
+    # node is the (sheet id, (col, row)) key of the cell in the workbook
+    def __init__(self, workbook, node):
         self.contents = None
-        self.tree = None
+        self.formula = None
         self.value = None
         self.workbook = workbook
-        self.location = location
-        self.sheet_name = sheet_name
+        self.node = node
+        self.coords = node[1]
 
     def __repr__(self):
         return self.contents
@@ -87,18 +251,15 @@ class _Cell():
             self.value = self.contents
 
     def _eval_formula(self):
-        if self.tree is None:
+        if self.formula is None:
             detail = 'Cannot be parsed; please check input'
             self.value = CellError(CellErrorType.PARSE_ERROR, detail)
             return
-        evaluator = FormulaEvaluator(self.workbook, self.sheet_name, self)
-        try:
-            self.value = evaluator.visit(self.tree)
-            if self.value is None:
-                self.value = decimal.Decimal()
-        except AssertionError:
-            detail = 'Bad reference to non-existent sheet'
-            self.value = CellError(CellErrorType.BAD_REFERENCE, detail)
+        if self.formula.dynamic:
+            self.workbook.clear_dynamic(self.node)
+        self.value = self.formula.evaluate(self)
+        if self.value is None:
+            self.value = decimal.Decimal()
 
     def update_value(self):
         '''
@@ -121,15 +282,22 @@ class _Cell():
         '''
         Adds dependencies to the graph
         '''
-        add_dep = self.workbook.add_dependency
-        add_to_graph = AddDependencies(add_dep, self.sheet_name, self)
-        add_to_graph.visit(self.tree)
+        self.add_refs(self.formula.refs, self.workbook.add_dependency)
+
+    def add_refs(self, refs, add_dep):
+        '''
+        Adds the given references of a compiled formula through add_dep,
+        resolving references without a sheet name to this sheet
+        '''
+        for ref in refs:
+            add_dep(self, ref[0], ref_coords(ref, self.coords))
 
     def set_contents(self, contents: str):
         '''
         set contents as given string and update its value
         if string represents formula, parse for value
         '''
+        self.formula = None
         if contents is None:
             self.contents = None
             return
@@ -138,13 +306,12 @@ class _Cell():
             return
         self.contents = contents.strip()
         if self.contents[0] == '=':
-            try:
-                self.tree = parser.parse(self.contents)
-                self.update_dependencies()
-            except lark.exceptions.LarkError:
-                self.tree = None
+            self.formula = compile_formula(self.contents, self.coords)
+            if self.formula is None:
                 detail = 'Cannot be parsed; please check input'
                 self.value = CellError(CellErrorType.PARSE_ERROR, detail)
+                return
+            self.update_dependencies()
 
     def get_contents(self):
         '''
@@ -166,8 +333,8 @@ class _Cell():
             return
         args = [old_name, new_name]
         evaluator = ContentManipulation(sheetname_manipulator, args)
-        self.contents = '= '+ evaluator.transform(self.tree)
-        self.tree = parser.parse(self.contents)
+        self.contents = '= '+ evaluator.transform(parser.parse(self.contents))
+        self.formula = compile_formula(self.contents, self.coords)
 
     # given another location, compare to this cell's location
     # return contents with cell references adjusted accordingly
@@ -178,11 +345,14 @@ class _Cell():
         '''
         if self.contents[0] != '=':
             return self.contents
-        if self.tree is None:
+        if self.formula is None:
             return self.contents
-        args = [self.workbook, x_diff, y_diff, new_sheet_name]
+        # The shared parse tree was made at the anchor of the formula
+        x_diff += self.coords[0] - self.formula.anchor[0]
+        y_diff += self.coords[1] - self.formula.anchor[1]
+        args = [x_diff, y_diff, new_sheet_name]
         evaluator = ContentManipulation(cellref_manipulator, args)
-        return '= ' + evaluator.transform(self.tree)
+        return '= ' + evaluator.transform(self.formula.tree)
 
 def check_arithmetic_input(value):
     '''
@@ -239,203 +409,226 @@ def compare_op(value1, value2, operator):
     type_val2 = _TYPE_VALUE[type(value2)]
     return operator(type_val1, type_val2)
 
-class AddDependencies(lark.visitors.Interpreter):
+class CompiledFormula():
+    '''
+    A formula compiled into a Python closure.
+
+    Evaluate takes the cell being evaluated and returns its value. Refs are
+    the references the formula always depends on, as (sheet name, col, row,
+    absolute col, absolute row) tuples where relative parts are offsets from
+    the anchor and the sheet name is None for the cell's own sheet. Dynamic
+    is True when the formula contains functions that add dynamic
+    dependencies. Tree is the parse tree of the formula at the anchor.
     '''
-    Add the dependencies of the cell to the cellgraph
+    __slots__ = ('evaluate', 'refs', 'dynamic', 'tree', 'anchor')
+
+    # pylint: disable=R0913
+    def __init__(self, evaluate, refs, dynamic, tree, anchor):
+        self.evaluate = evaluate
+        self.refs = refs
+        self.dynamic = dynamic
+        self.tree = tree
+        self.anchor = anchor
+
+def _constant(value):
+    return lambda _: value
+
+def _read_cell(sheet, coords):
+    # Reads the value of a referenced cell in the given sheet
+    cell = sheet.get(coords)
+    if cell is not None:
+        return cell.value
+    if not is_valid_coords(coords):
+        detail = 'Bad reference to invalid location: ' + coords_to_loc(*coords)
+        return CellError(CellErrorType.BAD_REFERENCE, detail)
+    return None
+
+class FormulaCompiler(lark.visitors.Interpreter):
     '''
-    def __init__(self, add_dep, sheet_name, this_cell: _Cell):
-        self.add_dep = add_dep
-        self.sheet = sheet_name
-        self.this_cell = this_cell
+    Compiles a parsed formula into nested closures once, so evaluating it
+    does not walk the parse tree again
 
-    def function(self, tree):
-        '''
-        Ignore adding dependencies for certain functions
-        '''
-        custom_function = DICTIONARY_FUNCTIONS.get(tree.children[0])
-        if custom_function is None:
-            return
-        _, dynamic_dep = custom_function
-        if dynamic_dep:
-            if tree.children[1] is None:
-                return
-            self.visit(tree.children[1])
-            return
-        for child in tree.children[1:]:
-            if child is None:
-                break
-            self.visit(child)
+    Every method returns a pair of the closure for the subtree and the list
+    of references that the subtree always depends on. References are compiled
+    relative to the anchor, or as absolute when there is no anchor.
+    '''
+    def __init__(self, anchor: tuple[int, int] = None):
+        self.anchor = anchor
+        self.dynamic = False
 
-    def cell(self, tree):
+    def compile(self, tree) -> CompiledFormula:
         '''
-        Adds the cell references to the dependencies
+        Compiles the given parse tree of a formula
         '''
-        if len(tree.children) == 1:
-            cellref = tree.children[0].replace('$', '')
-            self.add_dep(self.this_cell, cellref, self.sheet)
-        else:
-            sheet_name = tree.children[0]
-            if sheet_name[0] == '\'':
-                sheet_name = sheet_name[1:-1]
-            cellref = tree.children[1].replace('$', '')
-            self.add_dep(self.this_cell, cellref, sheet_name)
+        evaluate, refs = self.visit(tree)
+        refs = tuple(dict.fromkeys(refs))
+        return CompiledFormula(evaluate, refs, self.dynamic, tree, self.anchor)
 
-class FormulaEvaluator(lark.visitors.Interpreter):
-    '''
-    parse value of cell formulas
-    '''
-    def __init__(self, workbook, sheet_name, this_cell):
-        self.workbook = workbook
-        self.sheet = sheet_name
-        self.this_cell = this_cell
+    def _arithmetic(self, tree):
+        left, l_refs = self.visit(tree.children[0])
+        right, r_refs = self.visit(tree.children[2])
+        apply = _ARITHMETIC_OPS[tree.children[1]]
+        def arithmetic(this_cell):
+            check = check_inputs(left(this_cell), right(this_cell))
+            if isinstance(check, CellError):
+                return check
+            return apply(check[0], check[1])
+        return arithmetic, l_refs + r_refs
 
-    @visit_children_decor
-    def add_expr(self, values):
+    def add_expr(self, tree):
         '''
-        evaluate an addition expressions
+        compile an addition expression
         '''
-        check = check_inputs(values[0], values[2])
-        if isinstance(check, CellError):
-            return check
-        v_1, v_2 = check
-        if values[1] == '+':
-            return v_1 + v_2
-        if values[1] == '-':
-            return v_1 - v_2
-        assert False, 'Unexpected operator: ' + values[1]
+        return self._arithmetic(tree)
 
-    @visit_children_decor
-    def mul_expr(self, values):
-        '''
-        evaluate a multiplication expression
-        '''
-        check = check_inputs(values[0], values[2])
-        if isinstance(check, CellError):
-            return check
-        v_1, v_2 = check
-        if values[1] == '*':
-            return v_1 * v_2
-        if values[1] == '/':
-            try:
-                return v_1 / v_2
-            except ZeroDivisionError as err:
-                detail = "Cannot divide by 0"
-                return CellError(CellErrorType.DIVIDE_BY_ZERO, detail, err)
-        assert False, 'Unexpected operator: ' + values[1]
-
-    @visit_children_decor
-    def concat_expr(self, values):
+    def mul_expr(self, tree):
         '''
-        evaluate a concatenation expression
+        compile a multiplication expression
         '''
-        v_1 = convert_str(values[0])
-        v_2 = convert_str(values[1])
-        if isinstance(v_1, CellError):
-            return v_1
-        if isinstance(v_2, CellError):
-            return v_2
-        return v_1 + v_2
+        return self._arithmetic(tree)
 
-    @visit_children_decor
-    def unary_op(self, values):
+    def concat_expr(self, tree):
         '''
-        calculate positive or negative value of given Decimal
+        compile a concatenation expression
         '''
-        val = check_arithmetic_input(values[1])
-        if isinstance(val, CellError):
-            return val
-        if values[0] == '+':
-            return val
-        if values[0] == '-':
-            return 0 - val
-        assert False, 'Unexpected operator: ' + values[0]
+        left, l_refs = self.visit(tree.children[0])
+        right, r_refs = self.visit(tree.children[1])
+        def concat_expr(this_cell):
+            v_1 = convert_str(left(this_cell))
+            v_2 = convert_str(right(this_cell))
+            if isinstance(v_1, CellError):
+                return v_1
+            if isinstance(v_2, CellError):
+                return v_2
+            return v_1 + v_2
+        return concat_expr, l_refs + r_refs
 
-    @visit_children_decor
-    def compare_expr(self, values):
+    def unary_op(self, tree):
         '''
-        Evaluate a comparison expression
+        compile the positive or negative of an expression
         '''
-        if values[0] is None and values[2] is None:
-            values[0] = decimal.Decimal()
-            values[2] = decimal.Decimal()
-        if values[0] is None:
-            values[0] = _COMPARISON_EMPTY_CELL[type(values[2])]
-        if values[2] is None:
-            values[2] = _COMPARISON_EMPTY_CELL[type(values[0])]
-        operator = _COMPARISON_LAMBDAS[values[1]]
-        return compare_op(values[0], values[2], operator)
+        operand, refs = self.visit(tree.children[1])
+        negate = tree.children[0] == '-'
+        def unary_op(this_cell):
+            val = check_arithmetic_input(operand(this_cell))
+            if isinstance(val, CellError) or not negate:
+                return val
+            return 0 - val
+        return unary_op, refs
+
+    def compare_expr(self, tree):
+        '''
+        compile a comparison expression
+        '''
+        left, l_refs = self.visit(tree.children[0])
+        right, r_refs = self.visit(tree.children[2])
+        compare = _COMPARISON_LAMBDAS[tree.children[1]]
+        def compare_expr(this_cell):
+            v_1 = left(this_cell)
+            v_2 = right(this_cell)
+            if v_1 is None and v_2 is None:
+                v_1 = v_2 = decimal.Decimal()
+            if v_1 is None:
+                v_1 = _COMPARISON_EMPTY_CELL[type(v_2)]
+            if v_2 is None:
+                v_2 = _COMPARISON_EMPTY_CELL[type(v_1)]
+            return compare_op(v_1, v_2, compare)
+        return compare_expr, l_refs + r_refs
 
     def function(self, tree):
         '''
-        Evaluate a function
+        compile a function call
+
+        Dynamic functions only depend on their first argument up front; the
+        references of the other arguments are added as dynamic dependencies
+        through add_dep(this_cell, index) when an argument is used.
         '''
-        function_name = tree.children[0]
-        custom_function = DICTIONARY_FUNCTIONS.get(function_name)
+        custom_function = DICTIONARY_FUNCTIONS.get(tree.children[0])
         if custom_function is None:
             detail = "Function name is not recognized"
-            return CellError(CellErrorType.BAD_NAME, detail)
+            return _constant(CellError(CellErrorType.BAD_NAME, detail)), []
         custom_func, dynamic_dep = custom_function
+        args = []
+        args_refs = []
+        for child in tree.children[1:]:
+            if child is None:
+                args.append(None)
+                args_refs.append([])
+                continue
+            arg, refs = self.visit(child)
+            args.append(arg)
+            args_refs.append(refs)
         if not dynamic_dep:
-            return custom_func(self, tree.children[1:])
-        self.workbook.clear_dynamic(self.this_cell)
-        add_dynamic = self.workbook.add_dynamic_dep
-        add_dep = AddDependencies(add_dynamic, self.sheet, self.this_cell)
-        return custom_func(self, add_dep, tree.children[1:])
+            return (lambda this_cell: custom_func(this_cell, args)), sum(args_refs, [])
+        self.dynamic = True
+        def add_dep(this_cell, index):
+            this_cell.add_refs(args_refs[index], this_cell.workbook.add_dynamic_dep)
+        return (lambda this_cell: custom_func(this_cell, add_dep, args)), args_refs[0]
 
     def error(self, tree):
         '''
-        return CellError value
+        compile a CellError value
         '''
         error = str_to_error(tree.children[0].upper())
-        return CellError(error, tree.children[0].upper())
+        return _constant(CellError(error, tree.children[0].upper())), []
 
     def number(self, tree):
         '''
-        return Decimal value of parsed number
+        compile the Decimal value of a parsed number
         '''
         num = tree.children[0]
         if '.' in num:
             num = num.rstrip('0').rstrip('.')
-        return decimal.Decimal(num)
+        return _constant(decimal.Decimal(num)), []
 
     def boolean(self, tree):
         '''
-        Return Boolean value
+        compile a Boolean value
         '''
-        return tree.children[0].upper() == 'TRUE'
+        return _constant(tree.children[0].upper() == 'TRUE'), []
 
     def string(self, tree):
         '''
-        return parsed string with quotes removed
+        compile a parsed string with quotes removed
         '''
-        return tree.children[0].value[1:-1]
+        return _constant(tree.children[0].value[1:-1]), []
 
     def parens(self, tree):
         '''
-        return contents within parentheses
+        compile the contents within parentheses
         '''
         return self.visit(tree.children[0])
 
     def cell(self, tree):
         '''
-        return value of cell refrenced in formula
+        compile a reference to the value of another cell
         '''
-        try:
-            if len(tree.children) == 1:
-                cellref = tree.children[0].replace('$', '').upper()
-                sheetref = self.sheet.upper()
-                cell_val = self.workbook.sheets[sheetref][cellref].get_value()
-            else:
-                sheet_name = tree.children[0]
-                if sheet_name[0] == '\'':
-                    sheet_name = sheet_name[1:-1]
-                cellref = tree.children[1].replace('$', '').upper()
-                sheetref = sheet_name.upper()
-                cell_val = self.workbook.sheets[sheetref][cellref].get_value()
-            return cell_val
-        except KeyError:
-            detail = 'Bad reference to non-existent sheet: '+sheet_name
-            return CellError(CellErrorType.BAD_REFERENCE, detail)
+        col_abs, _, row_abs, _ = _CELLREF.fullmatch(tree.children[-1]).groups()
+        col, row = loc_to_coords(tree.children[-1])
+        col_abs = self.anchor is None or bool(col_abs)
+        row_abs = self.anchor is None or bool(row_abs)
+        if not col_abs:
+            col -= self.anchor[0]
+        if not row_abs:
+            row -= self.anchor[1]
+        if len(tree.children) == 1:
+            ref = (None, col, row, col_abs, row_abs)
+            def local_cell(this_cell):
+                sheet = this_cell.workbook.sheet_cells[this_cell.node[0]]
+                return _read_cell(sheet, ref_coords(ref, this_cell.coords))
+            return local_cell, [ref]
+        sheet_name = tree.children[0]
+        if sheet_name[0] == '\'':
+            sheet_name = sheet_name[1:-1]
+        sheet_upper = sheet_name.upper()
+        ref = (sheet_name, col, row, col_abs, row_abs)
+        def sheet_cell(this_cell):
+            sheet = this_cell.workbook.sheets.get(sheet_upper)
+            if sheet is None:
+                detail = 'Bad reference to non-existent sheet: ' + sheet_upper
+                return CellError(CellErrorType.BAD_REFERENCE, detail)
+            return _read_cell(sheet, ref_coords(ref, this_cell.coords))
+        return sheet_cell, [ref]
 
 def sheetname_manipulator(old_and_new, values):
     '''
@@ -452,37 +645,33 @@ def sheetname_manipulator(old_and_new, values):
         return '\''+sheet_name+'\''+'!'+values[1]
     return sheet_name+'!'+values[1]
 
+def _shifted_ref(col: int, row: int, abs_col: bool, abs_row: bool) -> str:
+    # Writes a shifted cell reference, or #REF! if it is out of the sheet
+    if not is_valid_coords((col, row)):
+        return "#REF!"
+    letter_str, row_str = _CELLREF.fullmatch(coords_to_loc(col, row)).group(2, 4)
+    if abs_col:
+        letter_str = '$' + letter_str
+    if abs_row:
+        return letter_str + '$' + row_str
+    return letter_str + row_str
+
 def cellref_manipulator(args, values):
     '''
     return given cell reference with necessary locations replaced
     '''
-    workbook = args[0]
-    x_diff = args[1]
-    y_diff = args[2]
-    new_sheet_name = args[3]
-    abs_row = False
-    abs_col = False
-    if len(values) == 1:
-        if values[0][0] == '$':
-            x_diff = 0
-            abs_row = True
-            values[0] = values[0][1:]
-        if values[0].find('$') > 0:
-            y_diff = 0
-            abs_col= True
-        cellref = values[0].replace('$', '')
-        row, col = workbook.loc_to_tuple(cellref)
-        return workbook.tuple_to_loc(row + x_diff, col + y_diff, abs_row, abs_col)
-    if values[1][0] == '$':
+    x_diff = args[0]
+    y_diff = args[1]
+    new_sheet_name = args[2]
+    abs_col, _, abs_row, _ = _CELLREF.fullmatch(values[-1]).groups()
+    if abs_col:
         x_diff = 0
-        abs_row = True
-        values[0] = values[0][1:]
-    if values[1].find('$'):
+    if abs_row:
         y_diff = 0
-        abs_col = True
-    cellref = values[1].replace('$', '')
-    row, col = workbook.loc_to_tuple(cellref)
-    new_loc = workbook.tuple_to_loc(row + x_diff, col + y_diff, abs_row, abs_col)
+    col, row = loc_to_coords(values[-1])
+    new_loc = _shifted_ref(col + x_diff, row + y_diff, abs_col, abs_row)
+    if len(values) == 1:
+        return new_loc
     if new_sheet_name is not None:
         return new_sheet_name +'!'+ new_loc
     return values[0]+'!'+ new_loc
@@ -2,8 +2,13 @@
 The module implements a graph that keeps track of all the cell references.
 This detects loops and finds reference cells to update should one or several
 be updated at once.
+
+Loops are detected incrementally: the graph keeps a topological order of its
+cells (Pearce-Kelly) that every edge respects, except for the edges that
+closed a loop when they were added. Only when such loop edges exist does a
+search for SCC's need to run, and it only visits the cells it reaches.
 '''
-from collections import defaultdict
+from collections import defaultdict, deque
 
 class _CellGraph():
     '''
@@ -21,6 +26,14 @@ class _CellGraph():
         self.back_dynamic = defaultdict(set)
         # stores the nodes of the graph
         self.nodes = set()
+        # order is a topological order of the cells kept across edits; the
+        # edges in loop_edges are the only ones allowed to go against it
+        self.order = {}
+        self.min_order = 0
+        self.max_order = 0
+        self.loop_edges = set()
+        # set when an edge is removed and loop edges may fit the order again
+        self.retry_loops = False
         # disc is used to store discovery times of visited vertices
         self.disc = {}
         # low is used to store earliest visited node for each node
@@ -36,6 +49,14 @@ class _CellGraph():
         # stack is used to store all the connected ancestors (could be part of
         # SCC)
         self.stack = []
+        # components maps each cell in a loop to the loop found by the last
+        # search
+        self.components = {}
+        # restrictions of the last search to static edges, to a set of cells
+        # and to the dynamic edges of cells not in the stale set
+        self.static_only = False
+        self.within = None
+        self.stale = None
 
     # add edge between node1 and node2
     # node1 depends on the value of node2
@@ -48,6 +69,7 @@ class _CellGraph():
         self.back[node1].add(node2)
         self.nodes.add(node1)
         self.nodes.add(node2)
+        self.insert_order(node2, node1)
 
     def add_dynamic_dep(self, node1, node2):
         '''
@@ -57,6 +79,7 @@ class _CellGraph():
         self.back_dynamic[node1].add(node2)
         self.nodes.add(node1)
         self.nodes.add(node2)
+        self.insert_order(node2, node1)
 
     def clear_dynamic_dep(self, node):
         '''
@@ -64,8 +87,84 @@ class _CellGraph():
         '''
         for a_node in self.back_dynamic[node]:
             self.dynamic[a_node].remove(node)
+            self._edge_removed(a_node, node)
         self.back_dynamic[node].clear()
 
+    def _edge_removed(self, parent, child):
+        # Forget a loop edge once neither a static nor a dynamic edge is left
+        if not self.loop_edges:
+            return
+        if child in self.graph[parent] or child in self.dynamic[parent]:
+            return
+        self.loop_edges.discard((parent, child))
+        self.retry_loops = bool(self.loop_edges)
+
+    def _dag_children(self, node):
+        return [child for child in self.graph[node] | self.dynamic[node]
+                if (node, child) not in self.loop_edges]
+
+    def _dag_parents(self, node):
+        return [parent for parent in self.back[node] | self.back_dynamic[node]
+                if (parent, node) not in self.loop_edges]
+
+    def insert_order(self, parent, child) -> bool:
+        '''
+        Keeps the topological order valid for a new edge from parent to the
+        child depending on it. Only the cells ordered between the two are
+        searched (Pearce-Kelly). If the edge closes a loop it is recorded as a
+        loop edge instead and False is returned.
+        '''
+        if parent not in self.order:
+            self.min_order -= 1
+            self.order[parent] = self.min_order
+        if child not in self.order:
+            self.max_order += 1
+            self.order[child] = self.max_order
+        if (parent, child) in self.loop_edges:
+            return False
+        upper = self.order[parent]
+        lower = self.order[child]
+        if lower > upper:
+            return True
+
+        # Forward search from the child for cells ordered before the parent
+        forward = {child}
+        remaining = [child]
+        while remaining:
+            node = remaining.pop()
+            for a_node in self._dag_children(node):
+                if a_node == parent:
+                    self.loop_edges.add((parent, child))
+                    return False
+                if a_node not in forward and self.order[a_node] < upper:
+                    forward.add(a_node)
+                    remaining.append(a_node)
+
+        # Backward search from the parent for cells ordered after the child
+        backward = {parent}
+        remaining = [parent]
+        while remaining:
+            node = remaining.pop()
+            for a_node in self._dag_parents(node):
+                if a_node not in backward and self.order[a_node] > lower:
+                    backward.add(a_node)
+                    remaining.append(a_node)
+
+        # Reuse the same positions, placing the backward cells first
+        key = self.order.__getitem__
+        moved = sorted(backward, key=key) + sorted(forward, key=key)
+        positions = sorted(self.order[node] for node in moved)
+        for node, position in zip(moved, positions):
+            self.order[node] = position
+        return True
+
+    def _retry_loop_edges(self):
+        # Loop edges that fit the order again no longer need a search
+        self.retry_loops = False
+        for parent, child in list(self.loop_edges):
+            self.loop_edges.discard((parent, child))
+            self.insert_order(parent, child)
+
     def direct_refs(self, nodes: list):
         '''
         Finds the list of cells that reference the given list of cells.
@@ -82,6 +181,56 @@ class _CellGraph():
         '''
         return self.graph[node] | self.dynamic[node]
 
+    def get_parents(self, node):
+        '''
+        Return the cells that the given cell references statically
+        '''
+        return self.back.get(node, set())
+
+    def get_dynamic_parents(self, node):
+        '''
+        Return the cells that the given cell references dynamically
+        '''
+        return self.back_dynamic.get(node, set())
+
+    def dependents(self, nodes, known: set = frozenset()):
+        '''
+        Return the given cells and every cell that depends on them, directly
+        or indirectly. The dependents of known cells are not searched.
+        '''
+        visited = set(nodes)
+        remaining = deque(node for node in visited if node not in known)
+        while remaining:
+            node = remaining.popleft()
+            for child in self.get_children(node):
+                if child not in visited and child not in known:
+                    visited.add(child)
+                    remaining.append(child)
+        return visited
+
+    def precedents(self, nodes, within: set):
+        '''
+        Return the given cells and every cell within the given set that they
+        depend on, directly or indirectly.
+        '''
+        visited = set(nodes)
+        remaining = deque(visited)
+        while remaining:
+            node = remaining.popleft()
+            for parent in self.get_parents(node) | self.get_dynamic_parents(node):
+                if parent not in visited and parent in within:
+                    visited.add(parent)
+                    remaining.append(parent)
+        return visited
+
+    def referenced(self):
+        '''
+        Return the cells that are referenced by other cells
+        '''
+        nodes = [node for node, children in self.graph.items() if children]
+        nodes.extend(node for node, children in self.dynamic.items() if children)
+        return nodes
+
     def has_dynamic_refs(self, cell):
         '''
         Return whether the cell has dynamic references
@@ -129,18 +278,11 @@ class _CellGraph():
         '''
         for a_node in self.back[node]:
             self.graph[a_node].remove(node)
+            self._edge_removed(a_node, node)
         self.back[node].clear()
-        for a_node in self.back_dynamic[node]:
-            self.dynamic[a_node].remove(node)
-        self.back_dynamic[node].clear()
+        self.clear_dynamic_dep(node)
         if node in self.nodes:
             self.nodes.remove(node)
-        if node in self.disc:
-            self.disc.pop(node)
-        if node in self.low:
-            self.low.pop(node)
-        if node in self.in_stack:
-            self.in_stack.pop(node)
 
     def post_recursion(self, parent_child, _):
         '''
@@ -156,15 +298,16 @@ class _CellGraph():
                 in_scc = self.stack.pop()
                 scc.add(in_scc)
                 self.in_stack[in_scc] = False
-            if len(scc) > 1:
-                self.sccs.update(scc)
-                scc.clear()
-            else:
-                cell = scc.pop()
-                if cell in self.dynamic[cell]:
-                    self.sccs.add(cell)
-                if cell in self.graph[cell]:
-                    self.sccs.add(cell)
+            if len(scc) == 1:
+                cell = next(iter(scc))
+                is_loop = cell in self.graph[cell]
+                if not self.static_only and cell in self.dynamic[cell]:
+                    is_loop = self.stale is None or cell not in self.stale
+                if not is_loop:
+                    scc.clear()
+            self.sccs.update(scc)
+            for cell in scc:
+                self.components[cell] = scc
         if parent is not None:
             self.low[parent] = min(self.low[parent], self.low[child])
 
@@ -184,39 +327,59 @@ class _CellGraph():
         # to_do list to which the children recursion are stacked on top of
         to_do.append((self.post_recursion, parent_child))
         # Go through all vertices adjacent to this
-        for g_child in self.graph[child] | self.dynamic[child]:
+        adjacent = self.graph[child]
+        if not self.static_only:
+            dynamic = self.dynamic[child]
+            if self.stale is not None:
+                dynamic = dynamic - self.stale
+            adjacent = adjacent | dynamic
+        if self.within is not None:
+            adjacent = adjacent & self.within
+        for g_child in adjacent:
             # If v is not visited yet, then recur for it
-            if self.disc[g_child] == -1:
+            if g_child not in self.disc:
                 # Add recursion on child to the to_do
                 to_do.append((self.lazy_iter, (child, g_child)))
-            elif self.in_stack[g_child]:
+            elif self.in_stack.get(g_child):
                 # Update low value of 'u' only if 'v' is still in stack
                 # This is a loop as 'u' to 'v' is a back edge
                 self.low[child] = min(self.low[child], self.disc[g_child])
 
-    # pylint: disable=C0103
-    def lazy_SCC(self):
-        '''
-        The SCC algorithm that finds all SCC's which are loops. It avoids the
-        recursion limit by having all recursion calls passed back to it so
-        that it may call them instead.
-        '''
+    def _reset_search(self, static_only: bool = False, within: set = None,
+                      stale: set = None):
+        # Searches keep their state for the cells they visit only
         self.time = 0
+        self.disc = {}
+        self.low = {}
+        self.in_stack = {}
         self.sccs.clear()
         self.stack.clear()
-        for n in self.nodes:
-            self.disc[n] = -1
-            self.low[n] = -1
-            self.in_stack[n] = False
+        self.components.clear()
+        self.static_only = static_only
+        self.within = within
+        self.stale = stale
 
+    def _search(self, nodes):
         # A to_do list to perform recursions without creating frames
         to_do = []
-        for n in self.nodes:
-            if self.disc[n] == -1:
-                self.lazy_iter((None, n), to_do)
+        for node in nodes:
+            if node in self.disc:
+                continue
+            self.lazy_iter((None, node), to_do)
             while to_do:
                 recur, args = to_do.pop()
                 recur(args, to_do)
+        return self.sccs.copy()
+
+    # pylint: disable=C0103
+    def lazy_SCC(self):
+        '''
+        The SCC algorithm that finds all SCC's which are loops. It avoids the
+        recursion limit by having all recursion calls passed back to it so
+        that it may call them instead.
+        '''
+        self._reset_search()
+        self._search(self.nodes)
 
     def particular_SCC(self, node):
         '''
@@ -224,18 +387,39 @@ class _CellGraph():
         recursion limit by having all recursion calls passed back to it so
         that it may call them instead.
         '''
-        self.time = 0
-        self.sccs.clear()
-        self.stack.clear()
-        for n in self.nodes:
-            self.disc[n] = -1
-            self.low[n] = -1
-            self.in_stack[n] = False
+        return self.batch_SCC([node])
 
-        # A to_do list to perform recursions without creating frames
-        to_do = []
-        self.lazy_iter((None, node), to_do)
-        while to_do:
-            recur, args = to_do.pop()
-            recur(args, to_do)
-        return self.sccs.copy()
+    # pylint: disable=C0103
+    def batch_SCC(self, nodes, static_only: bool = False, within: set = None,
+                  stale: set = None):
+        '''
+        Finds all SCC's which are loops and reachable from any of the given
+        cells in a single search. The search may be restricted to static
+        edges, to the cells within a given set, and may ignore the dynamic
+        dependencies of the cells in a stale set.
+
+        Without loop edges the maintained order proves that there are no
+        loops, so no search is needed.
+        '''
+        self._reset_search(static_only, within, stale)
+        if self.retry_loops:
+            self._retry_loop_edges()
+        if not self.loop_edges:
+            return set()
+        return self._search(nodes)
+
+    # pylint: disable=C0103
+    def static_SCC(self, nodes: set):
+        '''
+        Finds the loops among the given cells that remain when dynamic edges
+        are ignored.
+        '''
+        return self.batch_SCC(nodes, static_only=True, within=nodes)
+
+    def loop_of(self, node):
+        '''
+        Return the loop the given cell is part of, or an empty set
+        '''
+        if node not in self.particular_SCC(node):
+            return set()
+        return self.components[node]
@@ -2,7 +2,6 @@
 The functions module implements function calls with many arguments or none
 '''
 import decimal
-import lark
 import sheets
 from . import cell
 from .cellerror import CellError
@@ -25,7 +24,7 @@ def check_boolean_input(value):
         return CellError(CellErrorType(5), detail)
     return bool(value)
 
-def func_and(evaluator, args):
+def func_and(this_cell, args):
     '''
     Function to perform boolean AND logic
     '''
@@ -33,7 +32,7 @@ def func_and(evaluator, args):
         detail = "Not enough arguments for AND"
         return CellError(CellErrorType(5), detail)
     for arg in args:
-        val = evaluator.visit(arg)
+        val = arg(this_cell)
         check = check_boolean_input(val)
         if isinstance(check, CellError):
             return check
@@ -41,7 +40,7 @@ def func_and(evaluator, args):
             return False
     return True
 
-def func_or(evaluator, args):
+def func_or(this_cell, args):
     '''
     Function to perform boolean OR logic
     '''
@@ -49,7 +48,7 @@ def func_or(evaluator, args):
         detail = "Not enough arguments for OR"
         return CellError(CellErrorType(5), detail)
     for arg in args:
-        val = evaluator.visit(arg)
+        val = arg(this_cell)
         check = check_boolean_input(val)
         if isinstance(check, CellError):
             return check
@@ -57,7 +56,7 @@ def func_or(evaluator, args):
             return True
     return False
 
-def func_not(evaluator, arg):
+def func_not(this_cell, arg):
     '''
     Function to perform boolean OR logic
     '''
@@ -67,13 +66,13 @@ def func_not(evaluator, arg):
     if len(arg) > 1:
         detail = "Too many arguments for NOT"
         return CellError(CellErrorType(5), detail)
-    val = evaluator.visit(arg[0])
+    val = arg[0](this_cell)
     check = check_boolean_input(val)
     if isinstance(check, CellError):
         return check
     return not check
 
-def func_xor(evaluator, args):
+def func_xor(this_cell, args):
     '''
     Function to perform boolean XOR logic
     '''
@@ -82,7 +81,7 @@ def func_xor(evaluator, args):
         return CellError(CellErrorType(5), detail)
     return_bool = False
     for arg in args:
-        val = evaluator.visit(arg)
+        val = arg(this_cell)
         check = check_boolean_input(val)
         if isinstance(check, CellError):
             return check
@@ -90,7 +89,7 @@ def func_xor(evaluator, args):
             return_bool = not return_bool
     return return_bool
 
-def func_exact(evaluator, args):
+def func_exact(this_cell, args):
     '''
     Function that compares two strings
     '''
@@ -100,11 +99,11 @@ def func_exact(evaluator, args):
     if len(args) > 2:
         detail = "Too many arguments for NOT"
         return CellError(CellErrorType(5), detail)
-    v_1 = cell.convert_str(evaluator.visit(args[0]))
-    v_2 = cell.convert_str(evaluator.visit(args[1]))
+    v_1 = cell.convert_str(args[0](this_cell))
+    v_2 = cell.convert_str(args[1](this_cell))
     return v_1 == v_2
 
-def func_if(evaluator, add_dep, args):
+def func_if(this_cell, add_dep, args):
     '''
     Function that evaluates the condition and the corresponding event
 
@@ -120,18 +119,18 @@ def func_if(evaluator, add_dep, args):
     if len(args) > 3:
         detail = "Too many arguments for IF"
         return CellError(CellErrorType(5), detail)
-    cond = check_boolean_input(evaluator.visit(args[0]))
+    cond = check_boolean_input(args[0](this_cell))
     if isinstance(cond, CellError):
         return cond
     if cond:
-        add_dep.visit(args[1])
-        return evaluator.visit(args[1])
+        add_dep(this_cell, 1)
+        return args[1](this_cell)
     if len(args) == 3:
-        add_dep.visit(args[2])
-        return evaluator.visit(args[2])
+        add_dep(this_cell, 2)
+        return args[2](this_cell)
     return False
 
-def func_iferror(evaluator, add_dep, args):
+def func_iferror(this_cell, add_dep, args):
     '''
     Function that evaluates the first value and then the second if it is an
     error
@@ -146,15 +145,15 @@ def func_iferror(evaluator, add_dep, args):
     if len(args) > 2:
         detail = "Too many arguments for IFERROR"
         return CellError(CellErrorType(5), detail)
-    val1 = evaluator.visit(args[0])
+    val1 = args[0](this_cell)
     if not isinstance(val1, CellError):
         return val1
     if len(args) == 2:
-        add_dep.visit(args[1])
-        return evaluator.visit(args[1])
+        add_dep(this_cell, 1)
+        return args[1](this_cell)
     return ""
 
-def func_choose(evaluator, add_dep, args):
+def func_choose(this_cell, add_dep, args):
     '''
     Function that evaluates the value for a given index
 
@@ -164,15 +163,15 @@ def func_choose(evaluator, add_dep, args):
     if len(args) < 2:
         detail = "Not enough arguments for CHOOSE"
         return CellError(CellErrorType.TYPE_ERROR, detail)
-    index = cell.check_arithmetic_input(evaluator.visit(args[0]))
+    index = cell.check_arithmetic_input(args[0](this_cell))
     if isinstance(index, decimal.Decimal):
         if 0 < index < len(args):
-            add_dep.visit(args[int(index)])
-            return evaluator.visit(args[int(index)])
+            add_dep(this_cell, int(index))
+            return args[int(index)](this_cell)
     detail = "The index is out of bounds"
     return CellError(CellErrorType.TYPE_ERROR, detail)
 
-def func_isblank(evaluator, args):
+def func_isblank(this_cell, args):
     '''
     Function that returns True if value is empty-cell value and False
     otherwise
@@ -185,10 +184,10 @@ def func_isblank(evaluator, args):
     if args[0] is None:
         detail = "Not enough arguments for ISBLANK"
         return CellError(CellErrorType.TYPE_ERROR, detail)
-    value = evaluator.visit(args[0])
+    value = args[0](this_cell)
     return value is None
 
-def func_iserror(evaluator, args):
+def func_iserror(this_cell, args):
     '''
     Function that returns True if value is empty-cell value and False
     otherwise
@@ -201,7 +200,7 @@ def func_iserror(evaluator, args):
     if args[0] is None:
         detail = "Not enough arguments for ISBLANK"
         return CellError(CellErrorType.TYPE_ERROR, detail)
-    value = evaluator.visit(args[0])
+    value = args[0](this_cell)
     return isinstance(value, CellError)
 
 def func_version(_, args):
@@ -213,7 +212,7 @@ def func_version(_, args):
         return CellError(CellErrorType.TYPE_ERROR, detail)
     return sheets.version
 
-def func_indirect(evaluator, add_dep, args):
+def func_indirect(this_cell, _, args):
     '''
     Function that parses a string into a cell reference and returns the cell's
     value
@@ -224,15 +223,16 @@ def func_indirect(evaluator, add_dep, args):
     if args[0] is None:
         detail = "Not enough arguments for INDIRECT"
         return CellError(CellErrorType.TYPE_ERROR, detail)
-    cellref_str = cell.convert_str(evaluator.visit(args[0]))
-    try:
-        cellref = cell.parser.parse('=' + cellref_str)
-    # The TypeError catches instances where the cellref_str is an error
-    except (lark.exceptions.LarkError, TypeError):
+    cellref_str = cell.convert_str(args[0](this_cell))
+    # The cellref_str may be an error instead of a string
+    cellref = None
+    if isinstance(cellref_str, str):
+        cellref = cell.compile_formula('=' + cellref_str)
+    if cellref is None:
         detail = "String is not a valid cell-reference"
         return CellError(CellErrorType.BAD_REFERENCE, detail)
-    add_dep.visit(cellref)
-    return evaluator.visit(cellref)
+    this_cell.add_refs(cellref.refs, this_cell.workbook.add_dynamic_dep)
+    return cellref.evaluate(this_cell)
 
 # Dictionary of Function Calls
 # The boolean stores whether the function will need dynamic dependencies
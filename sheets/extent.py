@@ -0,0 +1,77 @@
+'''
+The extent module keeps track of the extent of a sheet as cells are added and
+removed, without scanning the sheet.
+'''
+import heapq
+
+class _Axis():
+    '''
+    The occupied indices along one axis of a sheet. Counts hold the number of
+    cells at each index, and the heap holds the negated indices so that the
+    largest one is on top. Indices whose count dropped to zero are removed
+    from the heap lazily.
+    '''
+    def __init__(self):
+        self.counts = {}
+        self.heap = []
+
+    def add(self, index: int):
+        '''
+        Add a cell at the given index
+        '''
+        count = self.counts.get(index, 0)
+        if count == 0:
+            heapq.heappush(self.heap, -index)
+        self.counts[index] = count + 1
+
+    def remove(self, index: int):
+        '''
+        Remove a cell at the given index
+        '''
+        count = self.counts[index] - 1
+        if count:
+            self.counts[index] = count
+            return
+        del self.counts[index]
+        # Indices that were removed and added again may be in the heap twice
+        if len(self.heap) > 2 * len(self.counts) + 16:
+            self.heap = [-index for index in self.counts]
+            heapq.heapify(self.heap)
+        while self.heap and -self.heap[0] not in self.counts:
+            heapq.heappop(self.heap)
+
+    def max(self) -> int:
+        '''
+        Return the largest occupied index, or 0 if there is none
+        '''
+        return -self.heap[0] if self.heap else 0
+
+class Extent():
+    '''
+    The extent of a sheet, kept with the number of cells in every column and
+    every row. Adding or removing a cell takes O(log n) and reading the
+    extent takes O(1).
+    '''
+    def __init__(self):
+        self.cols = _Axis()
+        self.rows = _Axis()
+
+    def add(self, coords: tuple[int, int]):
+        '''
+        Add a cell with contents at the given (col, row)
+        '''
+        self.cols.add(coords[0])
+        self.rows.add(coords[1])
+
+    def remove(self, coords: tuple[int, int]):
+        '''
+        Remove the cell at the given (col, row)
+        '''
+        self.cols.remove(coords[0])
+        self.rows.remove(coords[1])
+
+    def get(self) -> tuple[int, int]:
+        '''
+        Return the extent as (number of columns, number of rows)
+        '''
+        return (self.cols.max(), self.rows.max())
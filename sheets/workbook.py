@@ -3,20 +3,34 @@ The workbook module implements the Workbook class that fits the specified
 API requirements. Furthermore, it implements internal calls for use with
 the cell and cellgraph modules.
 '''
-import re
 import os
 import json
 import string
 import logging
-from typing import Optional
+import decimal
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, Optional
 from .sort import Row
-from .cell import _Cell
+from .extent import Extent
+from .cell import _Cell, parse_location, is_valid_coords, coords_to_loc
 from .cellgraph import _CellGraph
 from .cellerror import CellErrorType, CellError
 
-_RE = re.compile('[$]?[A-Za-z]+[$]?[1-9][0-9]*')
 _SHEET_CHARS = set(" .?!,:;!@#$%^&*()-_"+string.ascii_letters+string.digits)
 
+def _same_value(old, new) -> bool:
+    # Errors of the same type are the same value, and numbers are only the
+    # same when they are written the same way (1.0 is not 1, True is not 1)
+    if isinstance(old, CellError) or isinstance(new, CellError):
+        return isinstance(old, CellError) and isinstance(new, CellError) \
+            and old.get_type() == new.get_type()
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, decimal.Decimal):
+        return old.compare_total(new) == 0
+    return old == new
+
 # pylint: disable=R0902
 # pylint: disable=R0904
 class Workbook():
@@ -27,15 +41,38 @@ class Workbook():
     should cause the workbook's contents to be updated properly.
     '''
 
-    def __init__(self):
+    def __init__(self, lazy: bool = False):
+        '''
+        In lazy mode, changing a cell only marks the cells depending on it as
+        dirty. Dirty cells are evaluated when their values are read, and
+        notifications are only sent by flush().
+        '''
         self.workbook = self
+        # sheets map each sheet name to its cells, keyed by (col, row). Every
+        # sheet also has an id that stays the same when it is renamed, and
+        # cells are known to the graph as (sheet id, (col, row)) nodes.
         self.sheets = {}
+        self.sheet_cells = {}
+        self._sheet_ids = {}
+        self._sheet_names = {}
+        self._next_sheet_id = 0
         self._extents = {}
         self._display_sheets = {}
         self._missing_sheets = {}
         self._graph = _CellGraph()
         self.on_cells_changed = []
         self.changed_cells = []
+        # cells staged by an open batch, kept in insertion order
+        self._batch_depth = 0
+        self._batch_cells = {}
+        # cells whose values are out of date in lazy mode
+        self._lazy = lazy
+        self._dirty = set()
+        # dirty cells that have to be evaluated again, as opposed to those
+        # that only might
+        self._stale = set()
+        # evaluations avoided because none of a cell's inputs changed
+        self.skipped_evaluations = 0
 
     def save_workbook(self, filename: string):
         '''
@@ -49,8 +86,8 @@ class Workbook():
         sheet_list = []
         for sheet in self.list_sheets():
             sheet_dict = {'name': sheet, 'cell-contents': {}}
-            for loc in self.sheets[sheet.upper()]:
-                sheet_dict['cell-contents'][loc] = self.sheets[sheet.upper()][loc].toJSON()
+            for coords, cell in self.sheets[sheet.upper()].items():
+                sheet_dict['cell-contents'][coords_to_loc(*coords)] = cell.toJSON()
             sheet_list.append(sheet_dict)
         with open(filename, 'w', encoding="utf-8") as out_file:
             json.dump({'sheets':sheet_list}, out_file, indent = 4)
@@ -70,25 +107,87 @@ class Workbook():
             return w_b
         file = open(filename, "r", encoding="utf-8")
         data = json.load(file)
-        for sheet in data['sheets']:
-            _, name = w_b.new_sheet(sheet['name'])
-            for loc in sheet['cell-contents']:
-                w_b.set_cell_contents(name, loc, sheet['cell-contents'][loc][1:-1])
+        with w_b.batch():
+            for sheet in data['sheets']:
+                _, name = w_b.new_sheet(sheet['name'])
+                for loc in sheet['cell-contents']:
+                    w_b.set_cell_contents(name, loc, sheet['cell-contents'][loc][1:-1])
         file.close()
         return w_b
 
+    @contextmanager
+    def batch(self):
+        '''
+        Context manager that stages cell changes made inside of it. The
+        dependencies of every changed cell are rebuilt immediately, but the
+        cycle check, the recalculation and the notification are run once,
+        when the outermost batch exits.
+
+        Values read inside of a batch do not reflect the staged changes.
+        '''
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._commit_batch()
+
+    def _commit_batch(self):
+        # Recalculate every staged cell in one pass and notify once
+        cells = list(self._batch_cells)
+        self._batch_cells.clear()
+        if cells:
+            self._update_cells(cells)
+        self._call_notification()
+
+    def set_cells_contents(self, cells: Iterable[tuple[str, str, str]]) -> None:
+        '''
+        Set the contents of many cells at once. The cells are given as an
+        iterable of 3-tuples of the form ([sheet name], [cell location],
+        [contents]) and are recalculated together as a single batch.
+        '''
+        with self.batch():
+            for sheet_name, loc, contents in cells:
+                self.set_cell_contents(sheet_name, loc, contents)
+
+    def flush(self) -> None:
+        '''
+        Evaluates every dirty cell and notifies of the cells whose values
+        changed since the last notification. Only needed in lazy mode.
+        '''
+        self._evaluate_dirty()
+        if not self._batch_depth:
+            self._send_notification()
+
+    def _evaluate_dirty(self):
+        # Brings every cell up to date before values are read in bulk
+        if self._dirty:
+            self._pull(list(self._dirty))
+
     def _call_notification(self):
+        # Notifications are held while a batch is open, and until a flush in
+        # lazy mode
+        if self._batch_depth or self._lazy:
+            return
+        self._send_notification()
+
+    def _send_notification(self):
         # Runs through all given notification functions and calls them on the
         # cells
+        # Cells may be reported more than once when updated in several steps
+        changed_cells = list(dict.fromkeys(self.changed_cells))
+        self.changed_cells.clear()
+        if not changed_cells:
+            return
         for call_func in self.on_cells_changed:
             try:
-                call_func(self, self.changed_cells)
+                call_func(self, changed_cells)
             # A general exception is used to catch any exception that a
             # notification may throw
             # pylint: disable=W0703
             except Exception:
                 continue
-        self.changed_cells.clear()
 
     def notify_cells_changed(self, notify_function):
         '''
@@ -117,9 +216,32 @@ class Workbook():
         # Checks that the sheet name exists within the workbook
         return sheet_name.upper() in self.sheets
 
-    def _location_exists(self, sheet_name:str, loc: str) -> bool:
-        # Checks that the location exists in the sheet
-        return loc.upper() in self.sheets[sheet_name.upper()].keys()
+    def _coords(self, loc: str) -> tuple[int, int]:
+        # Converts a location given to the workbook to (col, row)
+        coords = parse_location(loc)
+        if coords is None:
+            raise ValueError
+        return coords
+
+    def _cell_at(self, node) -> Optional[_Cell]:
+        # Returns the cell of the given node, or None if it has no cell
+        sheet = self.sheet_cells.get(node[0])
+        if sheet is None:
+            return None
+        return sheet.get(node[1])
+
+    def _sheet_nodes(self, sheet_id: int) -> list:
+        # Returns the nodes of a sheet's cells and of the blank cells in it
+        # that are referenced
+        nodes = dict.fromkeys(cell.node for cell in self.sheet_cells[sheet_id].values())
+        nodes.update(dict.fromkeys(node for node in self._graph.referenced()
+                                   if node[0] == sheet_id))
+        return list(nodes)
+
+    def _report_changed(self, node):
+        # Records that the value of the cell of the given node changed
+        sheet_upper = self._sheet_names[node[0]]
+        self.changed_cells.append((self._display_sheets[sheet_upper], coords_to_loc(*node[1])))
 
     # returns false if given sheet name has leading or trailing whitespace,
     # already exists in the workbook, or contains an illegal character true
@@ -141,52 +263,11 @@ class Workbook():
             return False
         return True
 
-    def loc_to_tuple(self, loc: str):
-        '''
-        Converts a location to 2-tuple (row, col)
-        '''
-        row, col = 0, 0
-        for i, char in enumerate(loc):
-            if char.upper().isalpha():
-                row = (row * 26) + (ord(char.upper()) - ord('A') + 1)
-            else:
-                col = int(loc[i:])
-                break
-        return (row, col)
-
-    def tuple_to_loc(self, row: int, col: int, abs_row: bool = None, abs_col: bool = None) -> str:
-        '''
-        Converts row and col to location in workbook
-        '''
-        letter_str = ""
-        while row > 0:
-            modulo = (row - 1) % 26
-            letter_str = (chr((modulo) + ord('A'))) + letter_str
-            row = (row - 1) // 26
-        if not self._is_valid_location(letter_str + str(col)):
-            return "#REF!"
-        if abs_row:
-            letter_str = '$' + letter_str
-        if abs_col:
-            return letter_str + '$' + str(col)
-        return letter_str + str(col)
-
-    # returns whether the given string represents a valid location in the sheet
-    def _is_valid_location(self, location: str) -> bool:
-        if len(location) > 8 or len(location) < 2:
-            return False
-        if _RE.match(location) is None:
-            return False
-        # check that location is within limits A-ZZZZ and 1-9999
-        row, col = self.loc_to_tuple(location)
-        if row > 475254 or col > 9999:
-            return False
-        return True
-
     def _check_missing_sheets(self, sheet_name: str):
         '''
         Check missing sheets to update cells that may need it
         '''
+        self._evaluate_dirty()
         sheet_upper = sheet_name.upper()
         if not sheet_upper in self._missing_sheets:
             return
@@ -194,10 +275,10 @@ class Workbook():
             old_val = cell.get_value()
             cell.update_dependencies()
             cell.update_value()
-            if old_val == cell.get_value():
+            if _same_value(old_val, cell.get_value()):
                 continue
-            self.changed_cells.append((cell.sheet_name, cell.location))
-        self._update_references(self._missing_sheets[sheet_upper])
+            self._report_changed(cell.node)
+        self._update_references([cell.node for cell in self._missing_sheets[sheet_upper]])
         self._call_notification()
 
     def new_sheet(self, sheet_name: str = None) -> tuple[int, str]:
@@ -212,79 +293,214 @@ class Workbook():
             sheet_name = "Sheet" + str(num)
         elif not self._is_valid_sheet(sheet_name):
             raise ValueError
-        self.sheets[sheet_name.upper()] = {}
-        self._display_sheets[sheet_name.upper()] = sheet_name
-        self._update_sheet_extent(sheet_name.upper(), None)
+        sheet_upper = sheet_name.upper()
+        cells = {}
+        self.sheets[sheet_upper] = cells
+        self.sheet_cells[self._next_sheet_id] = cells
+        self._sheet_ids[sheet_upper] = self._next_sheet_id
+        self._sheet_names[self._next_sheet_id] = sheet_upper
+        self._next_sheet_id += 1
+        self._display_sheets[sheet_upper] = sheet_name
+        self._extents[sheet_upper] = Extent()
         self._check_missing_sheets(sheet_name)
         return (self.num_sheets()-1, sheet_name)
 
-    # Takes a list of cells who have been updated and updates their references
+    # Takes a list of nodes whose cells have been updated and updates their
+    # references
     # Does NOT UPDATE the given cells
-    def _update_references(self, cells: list):
-        original_set = cells.copy()
-        ref_cells = []
-        self._graph.bfs_nodes(cells, ref_cells)
-        for cell in ref_cells:
-            if cell in original_set:
+    def _update_references(self, nodes: list):
+        original_set = set(nodes)
+        ref_nodes = []
+        self._graph.bfs_nodes(list(nodes), ref_nodes)
+        for node in ref_nodes:
+            if node in original_set:
+                continue
+            cell = self._cell_at(node)
+            if cell is None:
                 continue
             old_val = cell.get_value()
             cell.update_value()
-            if old_val == cell.get_value():
+            if _same_value(old_val, cell.get_value()):
                 continue
-            self.changed_cells.append((cell.sheet_name, cell.location))
-
-    def _update_cells_in_loop(self, cell, sccs: set[_Cell]):
-        cells_to_update = []
-        for in_loop in sccs:
-            old_val = in_loop.get_value()
+            self._report_changed(node)
+
+    def _set_circular(self, nodes, done: set, changed: set) -> list:
+        # Marks the cells of the given nodes as part of a loop, returning
+        # those that were not already evaluated in this pass
+        marked = []
+        for in_loop in nodes:
+            if in_loop in done:
+                continue
+            cell = self._cell_at(in_loop)
+            old_val = cell.get_value()
             detail = "Circular reference detected"
-            in_loop.value = CellError(CellErrorType(2), detail)
-            if old_val != in_loop.get_value():
-                sheet_name = in_loop.sheet_name
-                loc = in_loop.location
-                self.changed_cells.append((sheet_name, loc))
-            for child in self._graph.get_children(in_loop) - sccs:
-                if child in cells_to_update:
-                    continue
-                cells_to_update.append(child)
-        self._update_cell_values(cell, cells_to_update, sccs)
-
-    def _update_cell_values(self, cell, cells_to_update: list[_Cell], sccs: set):
-        dynamic_refs = self._graph.dynamic_refs()
-        while cells_to_update:
-            to_update = cells_to_update.pop(0)
-            old_val = to_update.get_value()
-            to_update.update_value()
-            if self._graph.has_dynamic_refs(to_update):
-                dynamic_refs = self._graph.dynamic_refs()
-                sccs = self._graph.particular_SCC(cell)
-                if to_update in sccs:
-                    self._update_cells_in_loop(to_update, sccs)
-                    continue
-            if old_val != to_update.get_value():
-                sheet_name = to_update.sheet_name
-                loc = to_update.location
-                self.changed_cells.append((sheet_name, loc))
-            for child in self._graph.get_children(to_update):
-                if child in cells_to_update:
+            cell.value = CellError(CellErrorType(2), detail)
+            if not _same_value(old_val, cell.get_value()):
+                self._report_changed(in_loop)
+                changed.add(in_loop)
+            done.add(in_loop)
+            marked.append(in_loop)
+        return marked
+
+    def _recalculate(self, affected: set, sccs: set, roots: set):
+        # Evaluates the affected nodes in topological order (Kahn's
+        # algorithm). Cells in sccs are in a loop unless the loop goes through
+        # a dynamic dependency, which may be broken once the cell owning it is
+        # evaluated again. Apart from the roots, a cell is only evaluated when
+        # one of the cells it depends on changed value in this pass. Affected
+        # nodes that turn out to depend on dirty cells outside of them are
+        # left dirty.
+        graph = self._graph
+        soft = {cell for cell in sccs if not sccs.isdisjoint(graph.get_dynamic_parents(cell))}
+        hard = graph.static_SCC(sccs) if soft else sccs
+
+        # Dynamic edges inside of a loop are not waited on until the cell
+        # owning them has been evaluated once
+        def is_counted(parent, child):
+            if child not in soft or parent not in sccs:
+                return True
+            return parent in graph.get_parents(child)
+
+        in_degree = dict.fromkeys(affected, 0)
+        for cell in affected:
+            if cell in hard:
+                continue
+            for child in graph.get_children(cell):
+                if child in in_degree and is_counted(cell, child):
+                    in_degree[child] += 1
+        done = set()
+        changed = set()
+        self._set_circular(hard, done, changed)
+        ready = deque(cell for cell, degree in in_degree.items()
+                      if degree == 0 and cell not in done)
+        old_values = {}
+        deferred = False
+        skipped = 0
+
+        def release(parents):
+            for parent in parents:
+                for child in graph.get_children(parent):
+                    if child in done or child not in in_degree:
+                        continue
+                    if not is_counted(parent, child):
+                        continue
+                    in_degree[child] -= 1
+                    if in_degree[child] == 0:
+                        ready.append(child)
+
+        # Cells that were in a loop may not be any more, so they are always
+        # evaluated
+        def is_needed(cell, target):
+            if cell in roots or cell in old_values:
+                return True
+            if not changed.isdisjoint(graph.get_parents(cell)) \
+                    or not changed.isdisjoint(graph.get_dynamic_parents(cell)):
+                return True
+            value = target.get_value()
+            return isinstance(value, CellError) \
+                and value.get_type() == CellErrorType.CIRCULAR_REFERENCE
+
+        while True:
+            while ready:
+                cell = ready.popleft()
+                # Blank cells that are only referenced have no cell to evaluate
+                target = self._cell_at(cell)
+                if target is None:
+                    if cell in roots:
+                        changed.add(cell)
+                elif not is_needed(cell, target):
+                    skipped += 1
+                else:
+                    old_values.setdefault(cell, target.get_value())
+                    target.update_value()
+                soft.discard(cell)
+                if self._dirty and any(parent in self._dirty and parent not in in_degree
+                                       for parent in graph.get_dynamic_parents(cell)):
+                    # Evaluated again once the dirty cells it now needs are
+                    if cell in old_values:
+                        target.value = old_values[cell]
+                    deferred = True
                     continue
-                if child in sccs - dynamic_refs:
+                # Dynamic dependencies may now point at cells not yet
+                # evaluated, so the cell is evaluated again after them
+                waiting = [parent for parent in graph.get_dynamic_parents(cell)
+                           if parent in in_degree and parent not in done]
+                if waiting:
+                    in_degree[cell] = len(waiting)
                     continue
-                cells_to_update.append(child)
-                for g_child in self._graph.get_children(child):
-                    if g_child in cells_to_update:
-                        cells_to_update.remove(g_child)
-                        cells_to_update.append(g_child)
+                done.add(cell)
+                if cell in old_values and not _same_value(old_values[cell], target.get_value()):
+                    changed.add(cell)
+                    self._report_changed(cell)
+                release([cell])
+
+            # Every cell left waits on another one left. Cells not evaluated
+            # yet may only wait on dynamic dependencies that are out of date,
+            # so they are evaluated first. Otherwise loops are searched
+            # without those dependencies, and the cells depending on the
+            # loops are evaluated next.
+            pending = {cell for cell in affected if cell not in done}
+            if deferred or not pending:
+                break
+            stale = {cell for cell in pending if cell not in old_values}
+            ready.extend(cell for cell in stale if graph.get_parents(cell).isdisjoint(pending))
+            if ready:
+                continue
+            loops = graph.batch_SCC(pending, within=pending, stale=stale)
+            if not loops:
+                break
+            release(self._set_circular(loops, done, changed))
+
+        # Anything left over is stuck waiting on a loop, unless it may be
+        # waiting on a deferred cell
+        left = [cell for cell in affected if cell not in done]
+        if not deferred:
+            self._set_circular(left, done, changed)
+            left = []
+        self.skipped_evaluations += skipped
+        if not self._dirty:
+            return
+        # Dirty cells depending on a cell that changed, or that were deferred
+        # after being evaluated, have to be evaluated again
+        for cell in changed:
+            self._stale.update(child for child in graph.get_children(cell)
+                               if child in self._dirty and child not in done)
+        self._stale.update(cell for cell in left if cell in roots or cell in old_values)
+        # Cells depending on dirty cells stay dirty
+        if left:
+            done.difference_update(graph.dependents(left))
+        self._dirty.difference_update(done)
+        self._stale.difference_update(done)
+
+    def _pull(self, nodes: list):
+        # Evaluates the given dirty nodes along with the dirty cells they
+        # depend on
+        while True:
+            needed = self._graph.precedents(
+                [node for node in nodes if node in self._dirty], self._dirty)
+            if not needed:
+                return
+            self._recalculate(needed, self._graph.batch_SCC(needed, within=needed),
+                              self._stale)
 
     # Update given cell and all cells dependent on given cell
     def _update_cell(self, cell: _Cell):
-        # Search for SCC's involved with given cell
-        sccs = self._graph.particular_SCC(cell)
-        # If the cell is in a SCC, then all cells touching it must be CIRCREF
-        if cell in sccs:
-            self._update_cells_in_loop(cell, sccs)
-        else:
-            self._update_cell_values(cell, [cell], sccs)
+        self._update_cells([cell.node])
+
+    # Update the cells of the given nodes and all cells dependent on them in a
+    # single pass
+    def _update_cells(self, cells: list):
+        if self._batch_depth:
+            self._batch_cells.update(dict.fromkeys(cells))
+            return
+        if self._lazy:
+            # Cells depending on dirty cells are already dirty
+            self._dirty.update(self._graph.dependents(cells, self._dirty))
+            self._stale.update(cells)
+            return
+        # Search for SCC's involved with given cells
+        sccs = self._graph.batch_SCC(cells)
+        self._recalculate(self._graph.dependents(cells), sccs, set(cells))
 
     def del_sheet(self, sheet_name: str) -> None:
         '''
@@ -292,11 +508,21 @@ class Workbook():
         Take cells of the deleted sheet and updates them to None
         '''
         if self._sheet_name_exists(sheet_name):
+            self._evaluate_dirty()
             sheet_upper = sheet_name.upper()
-            dead_sheet = self.sheets.pop(sheet_upper)
+            sheet_id = self._sheet_ids.pop(sheet_upper)
+            dead_nodes = self._sheet_nodes(sheet_id)
+            self.sheets.pop(sheet_upper)
+            self.sheet_cells.pop(sheet_id)
+            self._sheet_names.pop(sheet_id)
             self._display_sheets.pop(sheet_upper)
             self._extents.pop(sheet_upper)
-            self._update_references(list(dead_sheet.values()))
+            # The cells of the sheet no longer depend on anything
+            for cells in self._missing_sheets.values():
+                cells[:] = [cell for cell in cells if cell.node[0] != sheet_id]
+            for node in dead_nodes:
+                self._graph.remove_node(node)
+            self._update_references(dead_nodes)
             self._call_notification()
         else:
             raise KeyError
@@ -306,130 +532,98 @@ class Workbook():
         Return number of rows and columns in the given spreadsheet
         '''
         if self._sheet_name_exists(sheet_name):
-            return self._extents[sheet_name.upper()]
+            return self._extents[sheet_name.upper()].get()
         raise KeyError
 
-    def _search_for_extent(self, sheet_upper: str):
-        max_a, max_b = 0, 0
-        for loc in self.sheets[sheet_upper].keys():
-            content = self.sheets[sheet_upper][loc.upper()].get_contents()
-            if content is None:
-                continue
-            row, col = self.loc_to_tuple(loc)
-            if row > max_a:
-                max_a = row
-            if col > max_b:
-                max_b = col
-        return (max_a, max_b)
-
-    # when a spreadsheet is added or deleted, update the extent of that sheet
-    def _update_sheet_extent(self, sheet_name: str, cell: _Cell) -> None:
-        sheet_upper = sheet_name.upper()
-        if not self._sheet_name_exists(sheet_name):
-            return
-        if cell is None:
-            max_a, max_b = self._search_for_extent(sheet_upper)
-        elif cell.get_contents() is None:
-            if self.loc_to_tuple(cell.location) != self._extents[sheet_upper]:
-                return
-            max_a, max_b = self._search_for_extent(sheet_upper)
-        elif cell.get_contents():
-            max_a, max_b = self._extents[sheet_upper]
-            row, col = self.loc_to_tuple(cell.location)
-            if row > max_a:
-                max_a = row
-            if col > max_b:
-                max_b = col
-        self._extents[sheet_upper] = (max_a, max_b)
-
-    # Update the cellgraph and check for loops
-    def _check_for_loop(self):
-        self._graph.lazy_SCC()
-        # for those in SCC sets with other, set CIRCREF error
-        cells_in_loop = []
-        for cell in self._graph.nodes:
-            if cell in self._graph.sccs:
-                old_value = cell.value
-                cells_in_loop.append(cell)
-                err_str = "Circular reference detected"
-                cell.value = CellError(CellErrorType(2), err_str)
-                if old_value != cell.value:
-                    self.changed_cells.append((cell.sheet_name, cell.location))
-        return cells_in_loop
-
     # Internal call to add cells to sheet, avoids unnecessary checks
-    def _set_cell_contents(self, sheet_name: str, loc: str, contents:str):
-        if not self._sheet_name_exists(sheet_name):
-            raise KeyError
-        if not self._is_valid_location(loc):
-            raise ValueError
-
+    def _set_cell_contents(self, sheet_upper: str, coords: tuple[int, int],
+                           contents: str) -> _Cell:
         # check if the sheet already has a cell, if not create one
-        sheet_upper = sheet_name.upper()
-        if not self._location_exists(sheet_name, loc):
-            self.sheets[sheet_upper][loc.upper()] = _Cell(self.workbook, sheet_name, loc)
+        sheet = self.sheets[sheet_upper]
+        cell = sheet.get(coords)
+        if cell is None:
+            cell = _Cell(self.workbook, (self._sheet_ids[sheet_upper], coords))
+            sheet[coords] = cell
+            self._extents[sheet_upper].add(coords)
         else:
-            self._graph.remove_node(self.sheets[sheet_upper][loc.upper()])
+            self._graph.remove_node(cell.node)
             for _, cells in self._missing_sheets.items():
-                if self.sheets[sheet_upper][loc.upper()] in cells:
-                    cells.remove(self.sheets[sheet_upper][loc.upper()])
-
-        self.sheets[sheet_upper][loc.upper()].set_contents(contents)
+                if cell in cells:
+                    cells.remove(cell)
+
+        cell.set_contents(contents)
+        # Empty cells are not kept; the graph still knows their node
+        if cell.get_contents() is None:
+            del sheet[coords]
+            self._extents[sheet_upper].remove(coords)
+            if cell.get_value() is not None:
+                cell.value = None
+                self._report_changed(cell.node)
+        return cell
 
     # set the cell of the given location to the given contents
     def set_cell_contents(self, sheet_name: str, loc: str, contents:str) -> None:
         '''
         Set the cell of the given location to the given contents
         '''
-        self._set_cell_contents(sheet_name, loc, contents)
-        cell = self.sheets[sheet_name.upper()][loc.upper()]
+        if not self._sheet_name_exists(sheet_name):
+            raise KeyError
+        sheet_upper = sheet_name.upper()
+        cell = self._set_cell_contents(sheet_upper, self._coords(loc), contents)
         self._update_cell(cell)
         self._call_notification()
-        self._update_sheet_extent(sheet_name.upper(), cell)
 
-    def find_dest_cell(self, src_cell: _Cell, loc: str, sheet_name: str):
+    def find_dest_cell(self, src_cell: _Cell, sheet_name: Optional[str],
+                       coords: tuple[int, int]):
         '''
-        Find the destination cell that the src_cell is trying to reference
+        Find the node of the destination cell that the src_cell is trying to
+        reference; a sheet name of None is the sheet of the src_cell.
         Store in missing sheet if the sheet does not yet exist
         '''
-        sheet_upper = sheet_name.upper()
-        if not self._sheet_name_exists(sheet_name):
-            if sheet_upper not in self._missing_sheets:
-                self._missing_sheets[sheet_upper] = []
-            self._missing_sheets[sheet_upper].append(src_cell)
-            return None
-        if not self._is_valid_location(loc.upper()):
+        if sheet_name is None:
+            sheet_id = src_cell.node[0]
+        else:
+            sheet_upper = sheet_name.upper()
+            sheet_id = self._sheet_ids.get(sheet_upper)
+            if sheet_id is None:
+                if sheet_upper not in self._missing_sheets:
+                    self._missing_sheets[sheet_upper] = []
+                self._missing_sheets[sheet_upper].append(src_cell)
+                return None
+        if not is_valid_coords(coords):
             return None
 
-        # check if the sheet already has a cell, if not create one
-        if not self._location_exists(sheet_name, loc):
-            blank_cell = _Cell(self.workbook, sheet_name, loc)
-            self.sheets[sheet_upper][loc.upper()] = blank_cell
-        return self.sheets[sheet_upper][loc.upper()]
+        # Blank cells have no cell object, only a node in the graph
+        cell = self.sheet_cells[sheet_id].get(coords)
+        if cell is None:
+            return (sheet_id, coords)
+        return cell.node
 
-    def add_dependency(self, src_cell: _Cell, loc: str, sheet_name: str) -> None:
+    def add_dependency(self, src_cell: _Cell, sheet_name: Optional[str],
+                       coords: tuple[int, int]) -> None:
         '''
         Add dependency between cells in graph
         '''
-        dest_cell = self.find_dest_cell(src_cell, loc, sheet_name)
-        if dest_cell is None:
+        dest_node = self.find_dest_cell(src_cell, sheet_name, coords)
+        if dest_node is None:
             return
-        self._graph.add_edge(src_cell, dest_cell)
+        self._graph.add_edge(src_cell.node, dest_node)
 
-    def clear_dynamic(self, src_cell: _Cell):
+    def clear_dynamic(self, src_node):
         '''
         Clear the dynamic dependencies of a cell before evaluating
         '''
-        self._graph.clear_dynamic_dep(src_cell)
+        self._graph.clear_dynamic_dep(src_node)
 
-    def add_dynamic_dep(self, src_cell: _Cell, loc: str, sheet_name: str):
+    def add_dynamic_dep(self, src_cell: _Cell, sheet_name: Optional[str],
+                        coords: tuple[int, int]):
         '''
         Add dynamic dependency between cells in graph
         '''
-        dest_cell = self.find_dest_cell(src_cell, loc, sheet_name)
-        if dest_cell is None:
+        dest_node = self.find_dest_cell(src_cell, sheet_name, coords)
+        if dest_node is None:
             return
-        self._graph.add_dynamic_dep(src_cell, dest_cell)
+        self._graph.add_dynamic_dep(src_cell.node, dest_node)
 
     # return the contents of the cell at the given location
     def get_cell_contents(self, sheet_name: str, loc: str):
@@ -438,11 +632,10 @@ class Workbook():
         '''
         if not self._sheet_name_exists(sheet_name):
             raise KeyError
-        if not self._is_valid_location(loc):
-            raise ValueError
-        if not self._location_exists(sheet_name, loc):
+        cell = self.sheets[sheet_name.upper()].get(self._coords(loc))
+        if cell is None:
             return None
-        return self.sheets[sheet_name.upper()][loc.upper()].get_contents()
+        return cell.get_contents()
 
     # return the value of the cell at the given location
     def get_cell_value(self, sheet_name: str, location: str):
@@ -452,11 +645,12 @@ class Workbook():
         # parameter validation
         if not self._sheet_name_exists(sheet_name):
             raise KeyError
-        if not self._is_valid_location(location):
-            raise ValueError
-        if not self._location_exists(sheet_name, location):
+        cell = self.sheets[sheet_name.upper()].get(self._coords(location))
+        if cell is None:
             return None
-        return self.sheets[sheet_name.upper()][location.upper()].get_value()
+        if cell.node in self._dirty:
+            self._pull([cell.node])
+        return cell.get_value()
 
     def rename_sheet(self, sheet_name: str, new_name: str):
         '''
@@ -484,23 +678,19 @@ class Workbook():
         self._display_sheets = dict(sheets)
         extent = self._extents.pop(sheet_name.upper())
         self._extents[new_name.upper()] = extent
-        loc_cells = self.sheets.pop(sheet_name.upper())
-        self.sheets[new_name.upper()] = {}
-
-        # Change the sheet name value within the cells of the sheet
-        while loc_cells:
-            loc, cell = loc_cells.popitem()
-            cell.sheet_name = new_name
-            self.sheets[new_name.upper()][loc.upper()] = cell
+        # The cells are keyed by the sheet id, which is kept
+        self.sheets[new_name.upper()] = self.sheets.pop(sheet_name.upper())
+        sheet_id = self._sheet_ids.pop(sheet_name.upper())
+        self._sheet_ids[new_name.upper()] = sheet_id
+        self._sheet_names[sheet_id] = new_name.upper()
 
         # Change the sheet name references in formulas
-        cells = list(self.sheets[new_name.upper()].values())
-        direct_refs = self._graph.direct_refs(cells)
+        direct_refs = dict.fromkeys(self._graph.direct_refs(self._sheet_nodes(sheet_id)))
         new_ref = new_name
         if ' ' in new_name:
             new_ref = "\'"+new_name+"\'"
-        for cell in direct_refs:
-            cell.rename_sheet(new_ref, sheet_name)
+        for node in direct_refs:
+            self._cell_at(node).rename_sheet(new_ref, sheet_name)
         self._check_missing_sheets(new_name)
 
     def move_sheet(self, sheet_name: str, index: int):
@@ -527,6 +717,7 @@ class Workbook():
         '''
         if not self._sheet_name_exists(sheet_name):
             raise KeyError
+        self._evaluate_dirty()
         sheet = self.sheets[sheet_name.upper()]
         copy_name = self._display_sheets[sheet_name.upper()]
         num = 1
@@ -534,71 +725,64 @@ class Workbook():
             num += 1
         copy_name = copy_name + '_' + str(num)
         idx, copy_name = self.new_sheet(copy_name)
-        for (loc, cell) in sheet.items():
-            self._set_cell_contents(copy_name, loc, cell.get_contents())
-            self.sheets[copy_name.upper()][loc.upper()].value = cell.get_value()
+        for (coords, cell) in list(sheet.items()):
+            copied = self._set_cell_contents(copy_name.upper(), coords, cell.get_contents())
+            copied.value = cell.get_value()
         self._call_notification()
-        self._update_sheet_extent(copy_name.upper(), None)
         self._check_missing_sheets(copy_name)
         return idx, copy_name
 
-    def _check_relative_location(self, sheet_name: str, to_location: str, to_sheet):
-        if not self._sheet_name_exists(sheet_name):
-            raise KeyError
-        if to_sheet is not None and not self._sheet_name_exists(to_sheet):
-            raise ValueError
-        if not self._is_valid_location(to_location):
-            raise ValueError
-
     # pylint: disable=R0913
-    def _get_relative_contents(self, x_1, x_2, y_1, y_2, x_diff, y_diff,
-                               sheet_name, to_sheet, move: bool):
+    def _get_relative_contents(self, region, x_diff, y_diff, sheet_upper, to_sheet,
+                               move: bool):
         contents = {}
-        for i in range(min(x_1, x_2), max(x_1, x_2) + 1):
-            for j in range(min(y_1, y_2), max(y_1, y_2) + 1):
-                old_location = self.tuple_to_loc(i, j)
-                contents[old_location] = None
-                if not self._location_exists(sheet_name, old_location):
-                    continue
-                start_cell = self.sheets[sheet_name.upper()][old_location.upper()]
-                contents[old_location] = start_cell.get_relative_contents(x_diff, y_diff, to_sheet)
-                if move:
-                    self._set_cell_contents(sheet_name, old_location, None)
-                    self._update_cell(start_cell)
-                    self._update_sheet_extent(sheet_name.upper(), start_cell)
+        sheet = self.sheets[sheet_upper]
+        for coords in region:
+            contents[coords] = None
+            start_cell = sheet.get(coords)
+            if start_cell is None:
+                continue
+            if start_cell.get_contents() is not None:
+                contents[coords] = start_cell.get_relative_contents(x_diff, y_diff, to_sheet)
+            if move:
+                self._set_cell_contents(sheet_upper, coords, None)
+                self._update_cell(start_cell)
         return contents
 
     # pylint: disable=R0914
     def _replace_cells(self, sheet_name: str, start_location: str,
                          end_location: str, to_location: str,
                          move, to_sheet: Optional[str] = None):
+        if not self._sheet_name_exists(sheet_name):
+            raise KeyError
         if to_sheet is None:
             to_sheet = sheet_name
+        elif not self._sheet_name_exists(to_sheet):
+            raise ValueError
 
-        x_1, y_1 = self.loc_to_tuple(start_location)
-        x_2, y_2 = self.loc_to_tuple(end_location)
-        dest_tuple = self.loc_to_tuple(to_location)
-
-        self._check_relative_location(sheet_name, to_location, to_sheet)
+        x_1, y_1 = self._coords(start_location)
+        x_2, y_2 = self._coords(end_location)
+        dest_tuple = self._coords(to_location)
 
         min_loc = (min(x_1, x_2), min(y_1, y_2))
+        max_loc = (max(x_1, x_2), max(y_1, y_2))
 
         x_diff = dest_tuple[0] - min_loc[0]
         y_diff = dest_tuple[1] - min_loc[1]
+        if not is_valid_coords((max_loc[0] + x_diff, max_loc[1] + y_diff)):
+            raise ValueError
 
-        contents = self._get_relative_contents(x_1, x_2, y_1, y_2, x_diff, y_diff,
-                                               sheet_name, to_sheet, move)
-
-        for i in range(min(x_1, x_2), max(x_1, x_2) + 1):
-            for j in range(min(y_1, y_2), max(y_1, y_2) + 1):
-                old_location = self.tuple_to_loc(i, j)
-                new_location = self.tuple_to_loc(i + x_diff, j + y_diff)
-                self._set_cell_contents(to_sheet, new_location, contents[old_location])
-                cell = self.sheets[to_sheet.upper()][new_location.upper()]
+        region = [(i, j) for i in range(min_loc[0], max_loc[0] + 1)
+                  for j in range(min_loc[1], max_loc[1] + 1)]
+        sheet_upper = sheet_name.upper()
+        to_upper = to_sheet.upper()
+        with self.batch():
+            contents = self._get_relative_contents(region, x_diff, y_diff, sheet_upper,
+                                                   to_sheet, move)
+            for (i, j) in region:
+                cell = self._set_cell_contents(to_upper, (i + x_diff, j + y_diff),
+                                               contents[(i, j)])
                 self._update_cell(cell)
-                self._update_sheet_extent(sheet_name.upper(), cell)
-        self._call_notification()
-
 
     def move_cells(self, sheet_name: str, start_location: str,
             end_location: str, to_location: str, to_sheet: Optional[str] = None):
@@ -631,18 +815,17 @@ class Workbook():
         '''
         if not self._sheet_name_exists(sheet_name):
             raise KeyError
-        end_valid = self._is_valid_location(end_location)
-        start_valid = self._is_valid_location(start_location)
         unique_col = set(abs(col) for col in sort_cols)
         # Check for duplicate columns
         not_unique_col = len(unique_col) < len(sort_cols)
-        if (not end_valid and start_valid) or (not sort_cols) or (not_unique_col):
+        if (not sort_cols) or (not_unique_col):
             raise ValueError
 
         # Arrange the range of cells and check if they are valid
         sheet_upper = sheet_name.upper()
-        x_1, y_1 = self.loc_to_tuple(start_location)
-        x_2, y_2 = self.loc_to_tuple(end_location)
+        sheet = self.sheets[sheet_upper]
+        x_1, y_1 = self._coords(start_location)
+        x_2, y_2 = self._coords(end_location)
         min_x = min(x_1, x_2)
         max_x = max(x_1, x_2)
         min_y = min(y_1, y_2)
@@ -652,13 +835,13 @@ class Workbook():
             raise ValueError
 
         # Take rows and place them into adapter for sorting
+        self._evaluate_dirty()
         list_of_rows: list[Row] = []
         for row in range(min_y, max_y + 1):
             sorting_row = Row(row)
             for col in sort_cols:
                 sorting_row.add_column_order(col)
-                val_loc = self.tuple_to_loc(min_x + col - 1, row)
-                cell = self.sheets[sheet_upper].get(val_loc)
+                cell = sheet.get((min_x + col - 1, row))
                 val = None if cell is None else cell.get_value()
                 sorting_row.add_column_value(val)
             list_of_rows.append(sorting_row)
@@ -670,24 +853,16 @@ class Workbook():
             y_diff = min_y + idx - row.row_loc
             contents_of_row = []
             for col in range(min_x, max_x + 1):
-                cell_loc = self.tuple_to_loc(col, row.row_loc)
-                cell: _Cell = self.sheets[sheet_upper].get(cell_loc)
-                new_loc = self.tuple_to_loc(col, min_y + idx)
+                cell: _Cell = sheet.get((col, row.row_loc))
                 content = None
                 if cell is not None:
                     if cell.contents is not None:
                         content = cell.get_relative_contents(0, y_diff)
-                loc_content = (new_loc, content)
-                contents_of_row.append(loc_content)
+                contents_of_row.append(((col, min_y + idx), content))
             rows_contents.append(contents_of_row)
 
-        for row in rows_contents:
-            for new_loc, content in row:
-                cell = self.sheets[sheet_upper].get(new_loc)
-                old_val = None if cell is None else cell.get_value()
-                self._set_cell_contents(sheet_name, new_loc, content)
-                cell = self.sheets[sheet_upper].get(new_loc)
-                self._update_cell(cell)
-                if old_val != cell.get_value():
-                    self.changed_cells.append(cell)
-        self._call_notification()
+        with self.batch():
+            for row in rows_contents:
+                for new_coords, content in row:
+                    cell = self._set_cell_contents(sheet_upper, new_coords, content)
+                    self._update_cell(cell)
@@ -0,0 +1,63 @@
+# pylint: skip-file
+import context
+import unittest
+import decimal
+from sheets import *
+
+class TestBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wb = Workbook()
+        _, self.s1 = self.wb.new_sheet()
+        self.notified = []
+        self.wb.notify_cells_changed(lambda _, cells: self.notified.append(list(cells)))
+
+    def test_batch_values(self):
+        with self.wb.batch():
+            self.wb.set_cell_contents(self.s1, 'a1', '=a2 + a3')
+            self.wb.set_cell_contents(self.s1, 'a2', '1')
+            self.wb.set_cell_contents(self.s1, 'a3', '=a2 * 2')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1'), decimal.Decimal(3))
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a3'), decimal.Decimal(2))
+        self.assertEqual(self.wb.get_sheet_extent(self.s1), (1, 3))
+
+    def test_batch_single_notification(self):
+        self.wb.set_cells_contents([
+            (self.s1, 'a1', '1'),
+            (self.s1, 'a2', '=a1'),
+            (self.s1, 'a1', '2'),
+        ])
+        self.assertEqual(len(self.notified), 1)
+        self.assertEqual(sorted(self.notified[0]), [(self.s1, 'A1'), (self.s1, 'A2')])
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a2'), decimal.Decimal(2))
+
+    def test_nested_batch(self):
+        with self.wb.batch():
+            self.wb.set_cell_contents(self.s1, 'a1', '1')
+            with self.wb.batch():
+                self.wb.set_cell_contents(self.s1, 'b1', '=a1 + 1')
+            self.assertEqual(self.notified, [])
+        self.assertEqual(len(self.notified), 1)
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b1'), decimal.Decimal(2))
+
+    def test_batch_loop(self):
+        self.wb.set_cells_contents([
+            (self.s1, 'a1', '=a2'),
+            (self.s1, 'a2', '=a1'),
+            (self.s1, 'a3', '=a1 + 1'),
+        ])
+        for loc in ['a1', 'a2', 'a3']:
+            value = self.wb.get_cell_value(self.s1, loc)
+            self.assertIsInstance(value, CellError)
+            self.assertEqual(value.get_type(), CellErrorType.CIRCULAR_REFERENCE)
+        self.wb.set_cells_contents([(self.s1, 'a2', '5')])
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a3'), decimal.Decimal(6))
+
+    def test_batch_commits_on_error(self):
+        with self.assertRaises(KeyError):
+            with self.wb.batch():
+                self.wb.set_cell_contents(self.s1, 'a1', '7')
+                self.wb.set_cell_contents('missing', 'a1', '1')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1'), decimal.Decimal(7))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -110,5 +110,16 @@ class TestMethods(unittest.TestCase):
         self.assertIsInstance(a1_val, CellError)
         self.assertEqual(a1_val.get_type(), CellErrorType.TYPE_ERROR)
 
+    def test_nested_if_dependencies(self):
+        self.wb.set_cell_contents(self.s1, 'b1', '=IF(c1, IF(c2, d1, d2), 0)')
+        self.wb.set_cell_contents(self.s1, 'c1', 'true')
+        self.wb.set_cell_contents(self.s1, 'd1', '5')
+        self.wb.set_cell_contents(self.s1, 'd2', '6')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b1'), decimal.Decimal(6))
+        self.wb.set_cell_contents(self.s1, 'c2', 'true')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b1'), decimal.Decimal(5))
+        self.wb.set_cell_contents(self.s1, 'd1', '7')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b1'), decimal.Decimal(7))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,57 @@
+# pylint: skip-file
+import context
+import unittest
+import decimal
+from sheets import *
+from sheets import cell
+
+class TestFormulaCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wb = Workbook()
+        _, self.s1 = self.wb.new_sheet()
+
+    def test_relative_key(self):
+        self.assertEqual(cell.relative_key('=a1 + b2', (1, 1)),
+                         cell.relative_key('=B5 + c6', (2, 5)))
+        self.assertNotEqual(cell.relative_key('=$a1', (1, 1)),
+                            cell.relative_key('=$b1', (1, 1)))
+        self.assertEqual(cell.relative_key('=a$1', (1, 1)),
+                         cell.relative_key('=b$1', (2, 7)))
+        self.assertNotEqual(cell.relative_key('="a1"', (1, 1)),
+                            cell.relative_key('="a2"', (1, 2)))
+        self.assertEqual(cell.relative_key('=ISBLANK(a1)', (1, 1)),
+                         cell.relative_key('=ISBLANK(a2)', (1, 2)))
+
+    def test_fill_down_shares_formula(self):
+        cells = [(self.s1, 'b' + str(i), '=a' + str(i) + ' * 2') for i in range(1, 11)]
+        cells += [(self.s1, 'a' + str(i), str(i)) for i in range(1, 11)]
+        self.wb.set_cells_contents(cells)
+        sheet = self.wb.sheets[self.s1.upper()]
+        formulas = {id(sheet[(2, i)].formula) for i in range(1, 11)}
+        self.assertEqual(len(formulas), 1)
+        for i in range(1, 11):
+            value = self.wb.get_cell_value(self.s1, 'b' + str(i))
+            self.assertEqual(value, decimal.Decimal(i * 2))
+
+    def test_shared_formula_copy(self):
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 + $a$1')
+        self.wb.set_cell_contents(self.s1, 'b2', '=a2 + $a$1')
+        self.wb.copy_cells(self.s1, 'b2', 'b2', 'c5')
+        self.assertEqual(self.wb.get_cell_contents(self.s1, 'c5'), '= B5 + $A$1')
+
+    def test_sheet_reference_copy(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '=Sheet1!B1 + Sheet1!$C1 + Sheet1!D$1')
+        self.wb.copy_cells(self.s1, 'a1', 'a1', 'a3')
+        self.assertEqual(self.wb.get_cell_contents(self.s1, 'a3'),
+                         '= Sheet1!B3 + Sheet1!$C3 + Sheet1!D$1')
+
+    def test_parse_error_cached(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '=a2 +')
+        self.wb.set_cell_contents(self.s1, 'a2', '=a3 +')
+        for loc in ['a1', 'a2']:
+            value = self.wb.get_cell_value(self.s1, loc)
+            self.assertIsInstance(value, CellError)
+            self.assertEqual(value.get_type(), CellErrorType.PARSE_ERROR)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# pylint: skip-file
+import context
+import unittest
+import decimal
+from collections import Counter
+from sheets import *
+from sheets.cell import _Cell, coords_to_loc
+
+class TestLazy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wb = Workbook(lazy=True)
+        _, self.s1 = self.wb.new_sheet()
+        self.notified = []
+        self.wb.notify_cells_changed(lambda _, cells: self.notified.extend(cells))
+
+    def count_evaluations(self, func):
+        counts = Counter()
+        update_value = _Cell.update_value
+        def counting(cell):
+            counts[coords_to_loc(*cell.coords)] += 1
+            update_value(cell)
+        _Cell.update_value = counting
+        try:
+            func()
+        finally:
+            _Cell.update_value = update_value
+        return counts
+
+    def test_evaluated_on_read(self):
+        counts = self.count_evaluations(lambda: self.wb.set_cells_contents([
+            (self.s1, 'a1', '1'),
+            (self.s1, 'b1', '=a1 + 1'),
+            (self.s1, 'c1', '=b1 * 2'),
+        ]))
+        self.assertEqual(counts, Counter())
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(4))
+        counts = self.count_evaluations(
+            lambda: self.wb.get_cell_value(self.s1, 'c1'))
+        self.assertEqual(counts, Counter())
+
+    def test_only_needed_cells_evaluated(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 + 1')
+        self.wb.set_cell_contents(self.s1, 'b2', '=a1 + 2')
+        self.wb.set_cell_contents(self.s1, 'c1', '=b1 * 2')
+        counts = self.count_evaluations(
+            lambda: self.wb.get_cell_value(self.s1, 'b1'))
+        self.assertEqual(counts.keys(), {'A1', 'B1'})
+        counts = self.count_evaluations(self.wb.flush)
+        self.assertEqual(counts.keys(), {'B2', 'C1'})
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(4))
+
+    def test_notifications_on_flush(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'a2', '=a1 + 1')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a2'), decimal.Decimal(2))
+        self.assertEqual(self.notified, [])
+        self.wb.flush()
+        self.assertEqual(sorted(self.notified), [(self.s1, 'A1'), (self.s1, 'A2')])
+        self.notified.clear()
+        self.wb.flush()
+        self.assertEqual(self.notified, [])
+
+    def test_loop(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '=a2')
+        self.wb.set_cell_contents(self.s1, 'a2', '=a1')
+        self.wb.set_cell_contents(self.s1, 'a3', '=a1 + 1')
+        value = self.wb.get_cell_value(self.s1, 'a3')
+        self.assertIsInstance(value, CellError)
+        self.assertEqual(value.get_type(), CellErrorType.CIRCULAR_REFERENCE)
+        self.wb.set_cell_contents(self.s1, 'a2', '5')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a3'), decimal.Decimal(6))
+
+    def test_dynamic_dependency(self):
+        self.wb.set_cell_contents(self.s1, 'a1', 'false')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 * 2')
+        self.wb.set_cell_contents(self.s1, 'c1', '=IF(a1, b1 + 1, 0)')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(0))
+        self.wb.set_cell_contents(self.s1, 'a1', '3')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(7))
+        self.wb.set_cell_contents(self.s1, 'a1', '4')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(9))
+
+    def test_loop_behind_deferred_cell(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'c4', '=d2 + d1')
+        self.wb.set_cell_contents(self.s1, 'd2', '=IF(c4, b2, a3)')
+        self.wb.set_cell_contents(self.s1, 'd1', '=INDIRECT("A1")')
+        self.wb.get_cell_value(self.s1, 'd2')
+        self.wb.set_cell_contents(self.s1, 'd1', '=CHOOSE(d2, a1, b4)')
+        value = self.wb.get_cell_value(self.s1, 'd1')
+        self.assertIsInstance(value, CellError)
+        self.assertEqual(value.get_type(), CellErrorType.CIRCULAR_REFERENCE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -104,5 +104,31 @@ class TestMethods(unittest.TestCase):
         self.assertIsInstance(a2_v, CellError)
         self.assertEqual(a2_v.get_type(), CellErrorType.CIRCULAR_REFERENCE)
 
+    def test_loop_reformed(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '=a2 + 1')
+        self.wb.set_cell_contents(self.s1, 'a2', '=a3 + 1')
+        self.wb.set_cell_contents(self.s1, 'a3', '=a1 + 1')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1').get_type(),
+                         CellErrorType.CIRCULAR_REFERENCE)
+        self.wb.set_cell_contents(self.s1, 'a3', None)
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1'), decimal.Decimal(2))
+        self.wb.set_cell_contents(self.s1, 'a3', '=a1')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a2').get_type(),
+                         CellErrorType.CIRCULAR_REFERENCE)
+        self.wb.set_cell_contents(self.s1, 'a1', '5')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a3'), decimal.Decimal(5))
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a2'), decimal.Decimal(6))
+
+    def test_no_loop_search_without_loops(self):
+        for i in range(1, 50):
+            self.wb.set_cell_contents(self.s1, 'b' + str(i), '=b' + str(i + 1))
+        self.assertFalse(self.wb._graph.loop_edges)
+        self.wb.set_cell_contents(self.s1, 'b50', '=b1')
+        self.assertTrue(self.wb._graph.loop_edges)
+        self.wb.set_cell_contents(self.s1, 'b50', '1')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b1'), decimal.Decimal(1))
+        self.assertEqual(self.wb._graph.batch_SCC([]), set())
+        self.assertFalse(self.wb._graph.loop_edges)
+
 if __name__ == '__main__':
     unittest.main()
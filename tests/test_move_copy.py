@@ -434,6 +434,35 @@ class TestWorkbook(unittest.TestCase):
         wb.set_cell_contents(name, 'c1', None)
         wb.set_cell_contents(name, 'c2', None)
         wb.set_cell_contents(name, 'c3', None)
+    def test_move_cells_out_of_sheet(self):
+        wb.set_cell_contents(name, 'a9998', '1')
+        wb.set_cell_contents(name, 'a9999', '2')
+
+        with self.assertRaises(ValueError):
+            wb.move_cells(name, 'a9998', 'a9999', 'a9999')
+        with self.assertRaises(ValueError):
+            wb.copy_cells(name, 'a1', 'a2', 'a10000')
+
+        self.assertEqual(wb.get_cell_value(name, 'a9998'), 1)
+        self.assertEqual(wb.get_cell_value(name, 'a9999'), 2)
+
+        wb.set_cell_contents(name, 'a9998', None)
+        wb.set_cell_contents(name, 'a9999', None)
+
+    def test_copy_cells_to_sheet_extent(self):
+        wb.set_cell_contents(name, 'a1', '1')
+        wb.set_cell_contents(name, 'b2', '=a1 * 2')
+
+        wb.copy_cells(name, 'a1', 'b2', 'c3', name2)
+
+        self.assertEqual(wb.get_sheet_extent(name2), (4, 4))
+        self.assertEqual(wb.get_cell_contents(name2, 'd4'), '= C3 * 2')
+        self.assertEqual(wb.get_cell_value(name2, 'd4'), 2)
+
+        wb.set_cell_contents(name, 'a1', None)
+        wb.set_cell_contents(name, 'b2', None)
+        wb.set_cell_contents(name2, 'c3', None)
+        wb.set_cell_contents(name2, 'd4', None)
 
 if __name__ == '__main__':
     unittest.main()
@@ -200,6 +200,11 @@ class TestMethods(unittest.TestCase):
             self.wb.set_cell_contents(self.s1, 'a1', '=('+cellerrortype.error_to_str(errortype)+')')
             self.assertEqual(self.wb.get_cell_value(self.s1, 'a1').get_type(), errortype)
 
+    def test_invalid_location_reference(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '=AAAAA1 + 1')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1').get_type(),
+                         CellErrorType.BAD_REFERENCE)
+
     def test_expected_error(self):
         '''
         Test which error is returned and compares with expected error
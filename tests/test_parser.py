@@ -0,0 +1,66 @@
+# pylint: skip-file
+import context
+import unittest
+import random
+import lark
+from sheets import cell
+
+FORMULAS = [
+    '=1', '= 1 + 2 * 3', '=-a1', '=+$b$2 - c$3 / $d4', '=(1 + 2) * 3',
+    '=a1 & "x" & b2', '="a" = "A"', '=1 + 2 = 3 <> a1 & "b"', '=a1 != 2',
+    '=Sheet1!a1', '=Sheet1 ! a1 + 1', "='my sheet'!B2 * 2", '=Sheet1!=a1',
+    '=TRUE', '=false & "x"', '=TRUE1 + true', '=#REF! + #div/0!', '=.5 + 1.',
+    '=IF(a1, b1, c1)', '=if (a1 > 1, Sheet2!b1 & "x", -3 * (2 + 1))',
+    '=FOO()', '=AND(TRUE, FALSE, a1 = b1)', '=INDIRECT("Sheet1!" & "A1")',
+    '=(IF(a1, 1, 2)) + 1', '=A1(1)', '=TRUE(1)', '=TRUE!A1', '=a1!b1',
+    '=IF(a1, 1, 2) + 1', '=1 + ', '=a1 b1', '=AB1C', '=--1', '=1 &', '=()',
+    '=\'unclosed!a1', '="abc', '=#NAME?', '=a1 >= b1 < c1 == d1',
+]
+
+TOKENS = ['a1', '$b$2', 'Sheet1!c3', "'s x'!A1", 'true', 'FALSE', '3', '1.5',
+          '"q"', '#REF!', 'true1', 'Sheet1', 'x!']
+
+def generate(rand, depth):
+    choice = rand.random()
+    if depth > 3 or choice < 0.3:
+        return rand.choice(TOKENS)
+    if choice < 0.4:
+        name = rand.choice(['IF', 'isblank', 'Foo', 'TRUE'])
+        args = [generate(rand, depth + 1) for _ in range(rand.randint(0, 3))]
+        return name + ' (' + ', '.join(args) + ')'
+    if choice < 0.5:
+        return rand.choice('+-') + generate(rand, depth + 1)
+    if choice < 0.6:
+        return '(' + generate(rand, depth + 1) + ')'
+    operator = rand.choice(['+', '-', '*', '/', '&', '=', '<>', '!=', '>='])
+    return generate(rand, depth + 1) + rand.choice(['', ' ']) + operator + generate(rand, depth + 1)
+
+class TestParser(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The original Earley grammar is the reference for the LALR grammar
+        cls.reference = lark.Lark.open('formulas.lark', rel_to=cell.__file__,
+                                       start='formula')
+
+    def assert_same_tree(self, formula):
+        try:
+            expected = self.reference.parse(formula)
+        except lark.exceptions.LarkError:
+            expected = None
+        try:
+            actual = cell.parser.parse(formula)
+        except lark.exceptions.LarkError:
+            actual = None
+        self.assertEqual(expected, actual, formula)
+
+    def test_formulas(self):
+        for formula in FORMULAS:
+            self.assert_same_tree(formula)
+
+    def test_generated_formulas(self):
+        rand = random.Random(130)
+        for _ in range(300):
+            self.assert_same_tree('=' + generate(rand, 0))
+
+if __name__ == '__main__':
+    unittest.main()
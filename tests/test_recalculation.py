@@ -0,0 +1,116 @@
+# pylint: skip-file
+import context
+import unittest
+import decimal
+from collections import Counter
+from sheets import *
+from sheets.cell import _Cell, coords_to_loc
+
+class TestRecalculation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wb = Workbook()
+        _, self.s1 = self.wb.new_sheet()
+
+    def count_evaluations(self, func):
+        counts = Counter()
+        update_value = _Cell.update_value
+        def counting(cell):
+            counts[coords_to_loc(*cell.coords)] += 1
+            update_value(cell)
+        _Cell.update_value = counting
+        try:
+            func()
+        finally:
+            _Cell.update_value = update_value
+        return counts
+
+    def test_diamond_evaluated_once(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 + 1')
+        self.wb.set_cell_contents(self.s1, 'b2', '=a1 * 2')
+        self.wb.set_cell_contents(self.s1, 'c1', '=b1 + b2 + a1')
+        self.wb.set_cell_contents(self.s1, 'd1', '=c1 + b1')
+        counts = self.count_evaluations(
+            lambda: self.wb.set_cell_contents(self.s1, 'a1', '2'))
+        self.assertEqual(set(counts.values()), {1})
+        self.assertEqual(counts.keys(), {'A1', 'B1', 'B2', 'C1', 'D1'})
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(9))
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'd1'), decimal.Decimal(12))
+
+    def test_wide_fan_out(self):
+        cells = [(self.s1, 'b' + str(i), '=a1 + ' + str(i)) for i in range(1, 500)]
+        self.wb.set_cells_contents(cells)
+        counts = self.count_evaluations(
+            lambda: self.wb.set_cell_contents(self.s1, 'a1', '10'))
+        self.assertEqual(len(counts), 500)
+        self.assertEqual(set(counts.values()), {1})
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b499'), decimal.Decimal(509))
+
+    def test_dynamic_dependency_order(self):
+        self.wb.set_cell_contents(self.s1, 'a1', 'false')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 * 2')
+        self.wb.set_cell_contents(self.s1, 'c1', '=IF(a1, b1 + 1, 0)')
+        self.wb.set_cell_contents(self.s1, 'a1', '3')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(7))
+        self.wb.set_cell_contents(self.s1, 'a1', '4')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(9))
+
+    def test_dynamic_loop_broken(self):
+        self.wb.set_cell_contents(self.s1, 'a2', 'true')
+        self.wb.set_cell_contents(self.s1, 'a3', '=a1 + 1')
+        self.wb.set_cell_contents(self.s1, 'a1', '=IF(a2, a3, 5)')
+        for loc in ['a1', 'a3']:
+            value = self.wb.get_cell_value(self.s1, loc)
+            self.assertIsInstance(value, CellError)
+            self.assertEqual(value.get_type(), CellErrorType.CIRCULAR_REFERENCE)
+        self.wb.set_cell_contents(self.s1, 'a2', 'false')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1'), decimal.Decimal(5))
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a3'), decimal.Decimal(6))
+
+    def test_loop_through_new_dynamic_dependency(self):
+        self.wb.set_cell_contents(self.s1, 'c1', '=INDIRECT("B1")')
+        self.wb.set_cell_contents(self.s1, 'd2', '=IF(c1, 1, 2)')
+        self.wb.set_cell_contents(self.s1, 'a4', '=d2')
+        self.wb.set_cell_contents(self.s1, 'd1', '=IFERROR(a4, 0)')
+        self.wb.set_cell_contents(self.s1, 'b3', '=d1 + b1')
+        self.wb.set_cell_contents(self.s1, 'b1', '=INDIRECT("B3")')
+        for loc in ['b1', 'b3', 'c1', 'd2', 'a4', 'd1']:
+            value = self.wb.get_cell_value(self.s1, loc)
+            self.assertIsInstance(value, CellError)
+            self.assertEqual(value.get_type(), CellErrorType.CIRCULAR_REFERENCE)
+
+    def test_unchanged_value_stops_propagation(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 > 0')
+        self.wb.set_cell_contents(self.s1, 'c1', '=IF(b1, 10, 20)')
+        self.wb.set_cell_contents(self.s1, 'd1', '=c1 * 2')
+        self.wb.set_cell_contents(self.s1, 'd2', '=b1')
+        skipped = self.wb.skipped_evaluations
+        counts = self.count_evaluations(
+            lambda: self.wb.set_cell_contents(self.s1, 'a1', '5'))
+        self.assertEqual(counts.keys(), {'A1', 'B1'})
+        self.assertEqual(self.wb.skipped_evaluations - skipped, 3)
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'd1'), decimal.Decimal(20))
+
+    def test_toggled_input(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 * 2')
+        self.wb.set_cell_contents(self.s1, 'c1', '=b1 + 1')
+        for contents, expected in [('2', 5), ('1', 3), ('2', 5)]:
+            counts = self.count_evaluations(
+                lambda: self.wb.set_cell_contents(self.s1, 'a1', contents))
+            self.assertEqual(counts.keys(), {'A1', 'B1', 'C1'})
+            self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), decimal.Decimal(expected))
+        counts = self.count_evaluations(
+            lambda: self.wb.set_cell_contents(self.s1, 'a1', '2'))
+        self.assertEqual(counts.keys(), {'A1'})
+
+    def test_same_number_written_differently(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1')
+        self.wb.set_cell_contents(self.s1, 'c1', '=b1 & ""')
+        self.wb.set_cell_contents(self.s1, 'a1', '1.0')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'c1'), '1.0')
+
+if __name__ == '__main__':
+    unittest.main()
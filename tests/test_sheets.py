@@ -2,6 +2,7 @@
 import context
 import unittest
 import decimal
+import random
 from sheets import *
 
 class TestMethods(unittest.TestCase):
@@ -62,5 +63,29 @@ class TestMethods(unittest.TestCase):
         self.wb.set_cell_contents(self.s1, 'a1', '1')
         self.assertEqual(self.wb.get_sheet_extent(self.s1), (3, 3))
 
+    def test_extent_random_edits(self):
+        rand = random.Random(9)
+        filled = set()
+        for _ in range(500):
+            col, row = rand.randint(1, 8), rand.randint(1, 8)
+            loc = chr(ord('A') + col - 1) + str(row)
+            if rand.random() < 0.5:
+                self.wb.set_cell_contents(self.s1, loc, str(col))
+                filled.add((col, row))
+            else:
+                self.wb.set_cell_contents(self.s1, loc, None)
+                filled.discard((col, row))
+            expected = (max((c for c, _ in filled), default=0),
+                        max((r for _, r in filled), default=0))
+            self.assertEqual(self.wb.get_sheet_extent(self.s1), expected)
+
+    def test_extent_move_and_copy_sheet(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        self.wb.set_cell_contents(self.s1, 'd2', '2')
+        self.wb.move_cells(self.s1, 'd1', 'd2', 'b5')
+        self.assertEqual(self.wb.get_sheet_extent(self.s1), (2, 6))
+        _, copy_name = self.wb.copy_sheet(self.s1)
+        self.assertEqual(self.wb.get_sheet_extent(copy_name), (2, 6))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,41 @@
+# pylint: skip-file
+import context
+import unittest
+import decimal
+from sheets import *
+from sheets.cell import _Cell
+
+class TestStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wb = Workbook()
+        _, self.s1 = self.wb.new_sheet()
+        self.notified = []
+        self.wb.notify_cells_changed(lambda _, cells: self.notified.extend(cells))
+
+    def test_cell_slots(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '1')
+        cell = self.wb.sheets[self.s1.upper()][(1, 1)]
+        self.assertIsInstance(cell, _Cell)
+        self.assertFalse(hasattr(cell, '__dict__'))
+
+    def test_blank_references_not_stored(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '=b1 + c1 + Sheet1!d1')
+        self.assertEqual(list(self.wb.sheets[self.s1.upper()]), [(1, 1)])
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1'), decimal.Decimal())
+        self.assertIsNone(self.wb.get_cell_value(self.s1, 'b1'))
+        self.wb.set_cell_contents(self.s1, 'c1', '5')
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'a1'), decimal.Decimal(5))
+
+    def test_cleared_cell_removed(self):
+        self.wb.set_cell_contents(self.s1, 'a1', '5')
+        self.wb.set_cell_contents(self.s1, 'b1', '=a1 * 2')
+        self.notified.clear()
+        self.wb.set_cell_contents(self.s1, 'a1', None)
+        self.assertNotIn((1, 1), self.wb.sheets[self.s1.upper()])
+        self.assertEqual(self.notified, [(self.s1, 'A1'), (self.s1, 'B1')])
+        self.assertEqual(self.wb.get_cell_value(self.s1, 'b1'), decimal.Decimal())
+        self.wb.set_cell_contents(self.s1, 'a1', '  ')
+        self.assertNotIn((1, 1), self.wb.sheets[self.s1.upper()])
+
+if __name__ == '__main__':
+    unittest.main()